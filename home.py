@@ -2,6 +2,8 @@ import streamlit as st
 import os
 from utils.db import connect_db
 from utils.auth_utils import run_auth  # ✅ import modular auth
+from utils.orders_data import get_orders_dataset
+from utils.channel_rollup import get_channel_rollup
 
 # -------------------------------------------------------------
 # 🔒 Healthcheck: Keep app warm with Azure Health Check ping
@@ -35,6 +37,8 @@ st.markdown("<hr>", unsafe_allow_html=True)
 with st.sidebar:
     if st.button("🔄 Force Data Refresh"):
         st.cache_data.clear()
+        get_orders_dataset().invalidate()
+        get_channel_rollup().invalidate()
         st.success("✅ Cache cleared. Data will reload fresh on next page visit.")
         st.rerun()
 
@@ -1,10 +1,19 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+from utils.charts import line_chart, bar_chart, pie_chart  # ✅ Downsampled, cached figures
+from utils.html_tables import table_css, render_table  # ✅ Column-wise HTML tables
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from utils.auth_utils import run_auth
-from utils.db import connect_db
+from utils.orders_data import get_orders_dataset, orders_view, months_ago
+from utils.compact_schema import memory_summary
+from utils.kpi_queries import (
+    KPI_PERIODS, custom_period, kpi_windows, load_kpi_matrix, kpi_matrix_from_rollup, new_skus_by_period,
+)
+from utils.daily_rollup import DailyRollup
+from utils.sku_bitmaps import SkuBitmaps
+from utils.order_headers import OrderHeaders
+from utils.calendar_meta import get_calendar
 
 st.set_page_config(page_title="📊 MPTC Business Dashboard", layout="wide")
 
@@ -14,30 +23,33 @@ name, username = run_auth()
 st.title("🏭 Business Overview Dashboard")
 
 # -----------------------------------------------------
-# 🚀 LOAD DATA (Faster with persistent caching)
-@st.cache_data(ttl=3600, show_spinner="Loading data...", persist="disk")
-def load_data():
+# 🚀 LOAD DATA (view over the process-wide orders dataset — no per-page copy)
+# One frame per run: the rows, rollups, headers and SKU bitmaps below are all derived from
+# it, so a refresh swapping in a new frame mid-run cannot mix results from two frames
+dataset = get_orders_dataset()
+
+
+def load_data(frame):
     try:
-        conn = connect_db()
-        query = """
-            SELECT order_id, order_channel, order_date, despatch_date, order_value, 
-                   order_cust_postcode, product_sku, product_name, product_qty, customer_name, 
-                   product_price, order_courier_service
-            FROM OrdersDespatch
-            WHERE order_date >= DATEADD(MONTH, -12, GETDATE())
-        """
-        df = pd.read_sql(query, conn)
-        conn.close()
-        df['order_date'] = pd.to_datetime(df['order_date']).dt.normalize()
-        df['despatch_date'] = pd.to_datetime(df['despatch_date']).dt.normalize()
-        return df
+        return orders_view(
+            ['order_id', 'order_channel', 'order_date', 'despatch_date', 'order_value',
+             'order_cust_postcode', 'product_sku', 'product_name', 'product_qty', 'customer_name',
+             'product_price', 'order_courier_service'],
+            date_column='order_date',
+            start=months_ago(12)(),
+            frame=frame,
+        )
     except Exception as e:
         st.error(f"❌ Failed to load data: {e}")
         return pd.DataFrame()
 
-# ✅ Load once
 with st.spinner("📥 Loading OrdersDespatch data..."):
-    df = load_data()
+    try:
+        frame = dataset.frame()
+    except Exception as e:
+        st.error(f"❌ Failed to load data: {e}")
+        st.stop()
+    df = load_data(frame)
 
 if df.empty:
     st.stop()
@@ -46,28 +58,26 @@ if df.empty:
 # 🔄 Optional Manual Refresh (if needed later)
 with st.sidebar:
     if st.button("🔁 Force Reload Data"):
-        st.cache_data.clear()
+        st.cache_data.clear()  # also drops the cached KPI matrix
+        dataset.invalidate()
         st.success("✅ Cache cleared. Data will reload on next run.")
         st.rerun()
+
+    with st.expander("🧠 Orders Cache Footprint"):
+        schema_report = dataset.loader.schema_report
+        if schema_report is None:
+            st.caption("Available after the next full load from the database.")
+        else:
+            footprint = memory_summary(schema_report)
+            st.caption(
+                f"{footprint['bytes_before'] / 1e6:,.1f} MB → {footprint['bytes_after'] / 1e6:,.1f} MB "
+                f"({footprint['ratio']:.1f}x smaller)"
+            )
+            st.dataframe(schema_report, use_container_width=True, hide_index=True)
         
 # ------------------ KPI COMPARISON TABLE ------------------
 st.markdown("### 📊 KPI Comparison Table (based on Order Date)")
 
-from datetime import datetime, timedelta
-
-# Define time periods
-kpi_periods = {
-    "Yesterday": 1,
-    "Last 7 Days": 7,
-    "Last 1 Month": 30,
-    "Last 3 Months": 90,
-    "Last 6 Months": 180,
-    "Last 1 Year": 365
-}
-
-today = df['order_date'].max()
-rows = []
-
 # Arrow and dot logic
 def arrow_colored(t1, t2):
     if pd.isna(t1) or pd.isna(t2): return "-"
@@ -78,105 +88,82 @@ def arrow_colored(t1, t2):
     else:
         return f"{int(t1):,} <span style='color:#f4c430; font-size:18px;'>⚫</span>"
 
-# Build the table rows with correct de-duplication and calculations
-for label, days in kpi_periods.items():
-    if label == "Yesterday":
-        t1_start = today - timedelta(days=1)
-        t1_end = t1_start
-        t2_start = today - timedelta(days=2)
-        t2_end = t2_start
-    else:
-        t1_end = today
-        t1_start = today - timedelta(days=days - 1)
-        t2_end = t1_start - timedelta(days=1)
-        t2_start = t2_end - timedelta(days=days - 1)
-
-    # Filter time periods
-    df_t1 = df[(df['order_date'] >= t1_start) & (df['order_date'] <= t1_end)]
-    df_t2 = df[(df['order_date'] >= t2_start) & (df['order_date'] <= t2_end)]
-
-    # ✅ Deduplicate based on highest order_value per order_id
-    df_t1_unique = (
-        df_t1.sort_values('order_value', ascending=False)
-        .drop_duplicates(subset='order_id')
-    )
-    df_t2_unique = (
-        df_t2.sort_values('order_value', ascending=False)
-        .drop_duplicates(subset='order_id')
-    )
-
-    # ✅ Accurate KPIs
-    orders_t1 = df_t1_unique['order_id'].nunique()
-    orders_t2 = df_t2_unique['order_id'].nunique()
-    revenue_t1 = df_t1_unique['order_value'].sum()
-    revenue_t2 = df_t2_unique['order_value'].sum()
-    aov_t1 = revenue_t1 / orders_t1 if orders_t1 > 0 else 0
-    aov_t2 = revenue_t2 / orders_t2 if orders_t2 > 0 else 0
-    sku_t1 = df_t1['product_sku'].nunique()
-    sku_t2 = df_t2['product_sku'].nunique()
+# ✅ Daily rollup with running sums, built once per dataset refresh → every window is O(1)
+rollup = dataset.derived("daily_rollup", DailyRollup.from_frame, frame=frame)
+today = rollup.last_day
+# ✅ Per-day SKU bitmaps → distinct SKUs for any window are an OR + popcount, not a row scan
+order_skus = dataset.derived("sku_bitmaps:order_date", SkuBitmaps.from_frame, frame=frame)
+
+custom_kpi_range = st.sidebar.date_input("🧮 Custom KPI Period", [])
+custom_periods = {}
+if len(custom_kpi_range) == 2:
+    custom_start, custom_end = custom_kpi_range
+    custom_periods[f"{custom_start:%d %b %Y} → {custom_end:%d %b %Y}"] = custom_period(custom_start, custom_end, today)
+periods = {**KPI_PERIODS, **custom_periods}
+
+kpi_window_list = kpi_windows(today, periods)
+if rollup.covers(min(start for _, _, start, _ in kpi_window_list)):
+    kpi_matrix = kpi_matrix_from_rollup(rollup, order_skus, today, periods)
+else:
+    # A T-2 window (fixed or custom) reaches past the shared dataset's history → server-side aggregate
+    try:
+        kpi_matrix = load_kpi_matrix(today, periods)
+    except Exception as e:
+        st.caption(f"⚠️ KPI query failed, using loaded history only: {e}")
+        kpi_matrix = kpi_matrix_from_rollup(rollup, order_skus, today, periods)
+if max(end for _, _, _, end in kpi_window_list) > today:
+    st.caption(f"⚠️ Custom KPI period runs past the latest order date ({today:%d %b %Y}); later days count as zero.")
 
+rows = []
+for label in periods:
+    t1 = kpi_matrix.loc[(label, "T1")]
+    t2 = kpi_matrix.loc[(label, "T2")]
     row = {
         "Time": label,
-        "Orders_T1": arrow_colored(orders_t1, orders_t2),
-        "Orders_T2": f"{orders_t2:,}" if orders_t2 > 0 else "-",
-        "Revenue_T1": arrow_colored(revenue_t1, revenue_t2),
-        "Revenue_T2": f"{revenue_t2:,.0f}" if revenue_t2 > 0 else "-",
-        "AOV_T1": arrow_colored(aov_t1, aov_t2),
-        "AOV_T2": f"{aov_t2:,.0f}" if aov_t2 > 0 else "-",
-        "SKU_T1": arrow_colored(sku_t1, sku_t2),
-        "SKU_T2": f"{sku_t2:,}" if sku_t2 > 0 else "-"
+        "Orders_T1": arrow_colored(t1['orders'], t2['orders']),
+        "Orders_T2": f"{int(t2['orders']):,}" if t2['orders'] > 0 else "-",
+        "Revenue_T1": arrow_colored(t1['revenue'], t2['revenue']),
+        "Revenue_T2": f"{t2['revenue']:,.0f}" if t2['revenue'] > 0 else "-",
+        "AOV_T1": arrow_colored(t1['aov'], t2['aov']),
+        "AOV_T2": f"{t2['aov']:,.0f}" if t2['aov'] > 0 else "-",
+        "SKU_T1": arrow_colored(t1['skus'], t2['skus']),
+        "SKU_T2": f"{int(t2['skus']):,}" if t2['skus'] > 0 else "-"
     }
     rows.append(row)
 
 kpi_df = pd.DataFrame(rows)
 
-# Render table in HTML
-def render_kpi_table(df):
-    html = """
-    <style>
-    table.kpi-matrix {
-        border-collapse: collapse;
-        width: 100%;
-        font-size: 15px;
-    }
-    table.kpi-matrix th, table.kpi-matrix td {
-        border: 1px solid #ccc;
-        padding: 6px 10px;
-        text-align: center;
-    }
-    table.kpi-matrix th {
-        background-color: #f2f2f2;
-        font-weight: 600;
-    }
-    </style>
-    <table class='kpi-matrix'>
-        <thead>
-            <tr>
-                <th rowspan="2">KPI</th>
-                <th colspan="2">Total Orders</th>
-                <th colspan="2">Total Revenue</th>
-                <th colspan="2">Avg Order Value</th>
-                <th colspan="2">Unique SKUs</th>
-            </tr>
-            <tr>
-                <th>T-1</th><th>T-2</th>
-                <th>T-1</th><th>T-2</th>
-                <th>T-1</th><th>T-2</th>
-                <th>T-1</th><th>T-2</th>
-            </tr>
-        </thead>
-        <tbody>
-    """
-    for _, row in df.iterrows():
-        html += f"<tr><td>{row['Time']}</td>"
-        html += f"<td>{row['Orders_T1']}</td><td>{row['Orders_T2']}</td>"
-        html += f"<td>{row['Revenue_T1']}</td><td>{row['Revenue_T2']}</td>"
-        html += f"<td>{row['AOV_T1']}</td><td>{row['AOV_T2']}</td>"
-        html += f"<td>{row['SKU_T1']}</td><td>{row['SKU_T2']}</td></tr>"
-    html += "</tbody></table>"
-    return html
-
-st.markdown(render_kpi_table(kpi_df), unsafe_allow_html=True)
+# Render table in HTML (two-row header; cells already carry their arrow markup)
+KPI_TABLE_HEADER = """
+<tr>
+    <th rowspan="2">KPI</th>
+    <th colspan="2">Total Orders</th>
+    <th colspan="2">Total Revenue</th>
+    <th colspan="2">Avg Order Value</th>
+    <th colspan="2">Unique SKUs</th>
+</tr>
+<tr>
+    <th>T-1</th><th>T-2</th>
+    <th>T-1</th><th>T-2</th>
+    <th>T-1</th><th>T-2</th>
+    <th>T-1</th><th>T-2</th>
+</tr>
+"""
+
+table_css()
+st.markdown(render_table(kpi_df, raw_cols=kpi_df.columns, header=KPI_TABLE_HEADER, font_size=15), unsafe_allow_html=True)
+
+with st.expander("🆕 SKUs sold in T-1 but not in T-2"):
+    new_skus = new_skus_by_period(order_skus, today, periods)
+    st.dataframe(
+        pd.DataFrame({
+            "Time": list(new_skus),
+            "New SKUs": [len(skus) for skus in new_skus.values()],
+            "SKUs": [", ".join(map(str, skus[:50])) + (" …" if len(skus) > 50 else "") for skus in new_skus.values()],
+        }),
+        use_container_width=True,
+        hide_index=True,
+    )
 
 # ------------------ SIDEBAR DATE FILTER ------------------
 st.sidebar.header("📅 Filter by Date")
@@ -192,10 +179,9 @@ order_quick = st.sidebar.selectbox("🕒 Quick Order Date Range", [
 ])
 
 # --- Helper Function ---
-def get_range_from_option(option, available_dates):
-    if len(available_dates) == 0:
+def get_range_from_option(option, today):
+    if today is None:
         return None, None
-    today = max(available_dates)
     if option == "Yesterday":
         return today, today
     elif option == "Last 7 Days":
@@ -211,19 +197,20 @@ def get_range_from_option(option, available_dates):
     else:
         return None, None
 
-despatch_dates = sorted(df['despatch_date'].dropna().unique())
-order_dates = sorted(df['order_date'].dropna().unique())
+# Latest dates with data come from the shared calendars, not from sorting the loaded rows
+latest_despatch = get_calendar('despatch_date').max_date()
+latest_order = get_calendar('order_date').max_date()
 
 # --- Final Despatch Date Range (Replicating Page 2 Logic) ---
 if despatch_quick != "None":
-    despatch_start, despatch_end = get_range_from_option(despatch_quick, despatch_dates)
+    despatch_start, despatch_end = get_range_from_option(despatch_quick, latest_despatch)
 elif len(despatch_date_range) == 1:
     despatch_start = despatch_end = pd.to_datetime(despatch_date_range[0])
 elif len(despatch_date_range) == 2:
     despatch_start, despatch_end = pd.to_datetime(despatch_date_range)
 else:
     # Same as Page 2: show latest available 30 days by default
-    despatch_end = max(despatch_dates) if despatch_dates else datetime.today()
+    despatch_end = latest_despatch if latest_despatch is not None else datetime.today()
     despatch_start = despatch_end - timedelta(days=30)
 
 # --- Final Order Date Range (Optional only when filtered) ---
@@ -231,7 +218,7 @@ apply_order_filter = False
 order_start = order_end = None
 
 if order_quick != "None":
-    order_start, order_end = get_range_from_option(order_quick, order_dates)
+    order_start, order_end = get_range_from_option(order_quick, latest_order)
     apply_order_filter = True
 elif len(order_date_range) == 1:
     order_start = order_end = pd.to_datetime(order_date_range[0])
@@ -281,9 +268,11 @@ with col2:
 st.markdown("<br>", unsafe_allow_html=True)
 
 # ------------------ APPLY FILTERS ------------------
-filtered_df = df[
-    (df['despatch_date'].between(despatch_start, despatch_end)) &
-    (df['order_channel'].isin(selected_channels))
+# Despatch range = binary search on the despatch-ordered index; remaining masks only touch that slice
+filtered_df = dataset.date_index('despatch_date', frame=frame).slice(despatch_start, despatch_end)[df.columns]
+filtered_df = filtered_df[
+    (filtered_df['order_date'] >= months_ago(12)()) &
+    (filtered_df['order_channel'].isin(selected_channels))
 ]
 
 if apply_order_filter:
@@ -295,20 +284,32 @@ if filtered_df.empty:
 
 # ------------------ BUSINESS METRICS (Corrected) ------------------
 
-# Step 1: De-duplicate based on highest order_value per order_id (safe method)
-dedup_orders = (
-    filtered_df
-    .sort_values('order_value', ascending=False)
-    .drop_duplicates(subset='order_id')
+# Step 1: Order headers (highest order_value line per order_id), built once per dataset refresh
+headers = dataset.derived("order_headers", OrderHeaders.from_frame, frame=frame)
+order_mask = headers.select(
+    despatch=(despatch_start, despatch_end),
+    order=(order_start, order_end) if apply_order_filter else (months_ago(12)(), None),
+    channels=selected_channels,
 )
+dedup_orders = headers.orders(order_mask)
 
 # Step 2: Apply correct logic
-total_orders = dedup_orders['order_id'].nunique()
-total_revenue = dedup_orders['order_value'].sum()
-avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
+order_totals = headers.totals(order_mask)
+total_orders = order_totals['orders']
+total_revenue = order_totals['revenue']
+avg_order_value = order_totals['aov']
 
 # Step 3: Independent metrics
-unique_product_skus = filtered_df['product_sku'].nunique()
+if apply_order_filter:
+    # Two date filters at once → no single per-day index applies
+    unique_product_skus = filtered_df['product_sku'].nunique()
+else:
+    despatch_skus = dataset.derived(
+        "sku_bitmaps:despatch_date", lambda f: SkuBitmaps.from_frame(f, "despatch_date"), frame=frame
+    )
+    # Same 12-month bound as filtered_df and the order metrics, applied to the despatch date as on page 3
+    despatch_from = max(pd.Timestamp(despatch_start), pd.Timestamp(months_ago(12)()))
+    unique_product_skus = despatch_skus.count(despatch_from, despatch_end, selected_channels)
 total_quantity_ordered = filtered_df['product_qty'].sum()
 
 # Step 4: Display
@@ -322,26 +323,26 @@ col5.markdown(f"**📦 Total Quantity**<br><span style='font-size: 20px;'>{total
 # ------------------ VISUALIZATIONS ------------------
 st.subheader("📈 Revenue Trend Over Time")
 df_line = dedup_orders.groupby('order_date')['order_value'].sum().reset_index()
-fig_line = px.line(df_line, x='order_date', y='order_value', title="Order Value Over Time")
+fig_line = line_chart(df_line, x='order_date', y='order_value', title="Order Value Over Time")
 st.plotly_chart(fig_line, use_container_width=True)
 
-channel_summary = dedup_orders.groupby('order_channel').agg(
+channel_summary = dedup_orders.groupby('order_channel', observed=True).agg(
     total_orders_value=('order_value', 'sum'),
     orders_count=('order_id', 'nunique')
 ).reset_index()
 
 st.subheader("📊 Total Orders Value by Channel")
-fig_value_bar = px.bar(channel_summary, x="order_channel", y="total_orders_value", text="total_orders_value")
+fig_value_bar = bar_chart(channel_summary, x="order_channel", y="total_orders_value", text="total_orders_value")
 st.plotly_chart(fig_value_bar, use_container_width=True)
 
 st.subheader("📦 Orders Count by Channel")
-fig_count_bar = px.bar(channel_summary, x="order_channel", y="orders_count", text="orders_count")
+fig_count_bar = bar_chart(channel_summary, x="order_channel", y="orders_count", text="orders_count")
 st.plotly_chart(fig_count_bar, use_container_width=True)
 
 st.subheader("🍩 Revenue Share by Channel")
-fig_donut_value = px.pie(channel_summary, names='order_channel', values='total_orders_value', hole=0.4)
+fig_donut_value = pie_chart(channel_summary, names='order_channel', values='total_orders_value', hole=0.4)
 st.plotly_chart(fig_donut_value, use_container_width=True)
 
 st.subheader("🍩 Orders Count Share by Channel")
-fig_donut_count = px.pie(channel_summary, names='order_channel', values='orders_count', hole=0.4)
+fig_donut_count = pie_chart(channel_summary, names='order_channel', values='orders_count', hole=0.4)
 st.plotly_chart(fig_donut_count, use_container_width=True)
@@ -1,11 +1,19 @@
 import streamlit as st
 st.set_page_config(page_title="📋 Channel-wise Detailed Report", layout="wide")  # ✅ First Streamlit call
 
+import uuid
 import pandas as pd
-import pyodbc
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
 from utils.auth_utils import run_auth  # ✅ Use shared auth logic
+from utils.orders_data import get_orders_dataset, orders_view, months_ago  # ✅ Shared OrdersDespatch dataset
+from utils.order_headers import OrderHeaders  # ✅ One row per order, built once per refresh
+from utils.sku_bitmaps import SkuBitmaps  # ✅ Per-day SKU bitmaps for distinct counts
+from utils.date_index import date_slice  # ✅ Date ranges by binary search
+from utils.calendar_meta import get_calendar  # ✅ Shared date calendar
+from utils.sku_leaderboard import LeaderboardMemo, SkuLeaderboard, leaderboard_key  # ✅ Partial top/bottom-N
+from utils.lazy_downloads import lazy_download_button  # ✅ Built on click, cached by data
+from utils.exports import DATA_EXPORT_FORMATS  # ✅ Chunked gzip CSV / Parquet
 
 #-------------------------------------------------
 # 🔐 Run authentication
@@ -14,47 +22,34 @@ name, username = run_auth()
 # ------------------ PAGE TITLE ------------------
 st.title("🧾 Channel-wise Detailed Analytics")
 
-# ------------------ DATABASE CONNECTION ------------------
-def connect_db():
-    try:
-        return pyodbc.connect(
-            "DRIVER={ODBC Driver 17 for SQL Server};"
-            "SERVER=mptcecommerce-sql-server.database.windows.net;"
-            "DATABASE=mptcecommerce-db;"
-            "UID=mptcadmin;"
-            "PWD=Mptc@2025;"
-            "Connection Timeout=30"
-        )
-    except Exception as e:
-        st.error(f"❌ Database connection failed: {e}")
-        return None
-
 # ------------------ LOAD DATA FUNCTION ------------------
-@st.cache_data
-def load_data():
-    conn = connect_db()
-    if conn is None:
-        return pd.DataFrame()
+# One frame per run: the rows below, the order headers and the SKU memos are all derived
+# from it, so a refresh swapping in a new frame mid-run cannot misalign them
+dataset = get_orders_dataset()
+
+
+def load_data(frame):
     try:
-        query = """
-        SELECT order_id, order_channel, order_value, order_cust_postcode, product_sku, 
-               product_name, product_qty, product_price, despatch_date
-        FROM OrdersDespatch
-        WHERE despatch_date >= DATEADD(MONTH, -12, GETDATE())
-        """
-        df = pd.read_sql(query, conn)
-        conn.close()
-        return df
+        return orders_view(
+            ['order_id', 'order_channel', 'order_value', 'order_cust_postcode', 'product_sku',
+             'product_name', 'product_qty', 'product_price', 'despatch_date'],
+            date_column='despatch_date',
+            start=months_ago(12)(),
+            frame=frame,
+        )
     except Exception as e:
         st.error(f"❌ Query failed: {e}")
         return pd.DataFrame()
 
-df = load_data()
+try:
+    frame = dataset.frame()
+except Exception as e:
+    st.error(f"❌ Query failed: {e}")
+    st.stop()
+df = load_data(frame)
 if df.empty:
     st.stop()
 
-df['despatch_date'] = pd.to_datetime(df['despatch_date'])
-
 # ------------------ SIDEBAR: DESPATCH DATE FILTERS ------------------
 st.sidebar.header("📅 Filter by Despatch Date")
 
@@ -65,13 +60,10 @@ quick_range = st.sidebar.selectbox("🕒 Quick Despatch Range", [
 ])
 
 # Function to compute date ranges from dropdown option
-def get_range_from_option(option, df_date_col):
-    if df_date_col.empty:
+def get_range_from_option(option, latest_date):
+    if latest_date is None:
         return None, None
 
-    all_dates = sorted(df_date_col.dt.normalize().dropna().unique())
-    latest_date = max(all_dates)
-
     if option == "Yesterday":
         # Use the latest date that has data
         return latest_date, latest_date
@@ -88,24 +80,29 @@ def get_range_from_option(option, df_date_col):
     else:
         return None, None
 
+# Latest despatch date with data, from the shared date calendar (no sort of the loaded rows)
+latest_despatch = get_calendar('despatch_date').max_date()
+if latest_despatch is None:  # no despatched lines in the loaded window → nothing to filter on
+    st.warning("No despatch dates found in the loaded data.")
+    st.stop()
+
 # Determine final start_date and end_date
 if quick_range != "None":
-    start_date, end_date = get_range_from_option(quick_range, df['despatch_date'])
+    start_date, end_date = get_range_from_option(quick_range, latest_despatch)
 elif len(selected_range) == 1:
     start_date = end_date = pd.to_datetime(selected_range[0])
 elif len(selected_range) == 2:
     start_date, end_date = pd.to_datetime(selected_range)
 else:
-    end_date = df['despatch_date'].max().normalize()
+    end_date = latest_despatch
     start_date = end_date - timedelta(days=30)
 
-# Normalize despatch_date
-df['despatch_date'] = pd.to_datetime(df['despatch_date']).dt.normalize()
+# despatch_date is already a normalised datetime (compact schema "date"), so no in-place conversion here
 
 # Apply date filter
 st.caption(f"Debug: Filtering from {start_date.date()} to {end_date.date()}")
-st.caption(f"Max despatch date in data: {df['despatch_date'].max().date()}")
-filtered_df = df[df['despatch_date'].between(start_date, end_date)]
+st.caption(f"Max despatch date in data: {latest_despatch.date()}")
+filtered_df = date_slice(df, 'despatch_date', start_date, end_date)  # df is in despatch-date order
 
 # ------------------ CHANNEL FILTER ------------------
 channels = sorted(filtered_df['order_channel'].dropna().unique().tolist())
@@ -130,17 +127,22 @@ if filtered_df.empty:
 top_n = st.selectbox("Show Top/Bottom N Records", [5, 10, 15, 20, 25], index=1)
 
 # ------------------ KPIs ------------------
-# ✅ Corrected KPI Calculation Logic (matches Page 1)
-dedup_orders = (
-    filtered_df
-    .sort_values('order_value', ascending=False)
-    .drop_duplicates(subset='order_id')
+# ✅ Corrected KPI Calculation Logic (matches Page 1): highest order_value line per order_id
+despatch_from = max(pd.Timestamp(start_date), pd.Timestamp(months_ago(12)()))  # page window: last 12 months
+headers = dataset.derived("order_headers", OrderHeaders.from_frame, frame=frame)
+order_mask = headers.select(
+    despatch=(despatch_from, end_date),
+    channels=selected_channels,
 )
 
-total_orders = dedup_orders['order_id'].nunique()
-total_revenue = dedup_orders['order_value'].sum()
-avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
-unique_skus = filtered_df['product_sku'].nunique()
+order_totals = headers.totals(order_mask)
+total_orders = order_totals['orders']
+total_revenue = order_totals['revenue']
+avg_order_value = order_totals['aov']
+despatch_skus = dataset.derived(
+    "sku_bitmaps:despatch_date", lambda f: SkuBitmaps.from_frame(f, "despatch_date"), frame=frame
+)
+unique_skus = despatch_skus.count(despatch_from, end_date, selected_channels)
 
 col1, col2, col3, col4 = st.columns(4)
 col1.markdown(f"**🛒 Total Orders**<br><span style='font-size: 20px;'>{total_orders:,}</span>", unsafe_allow_html=True)
@@ -149,52 +151,43 @@ col3.markdown(f"**📦 Avg Order Value**<br><span style='font-size: 20px;'>£ {a
 col4.markdown(f"**🔢 Unique SKUs Sold**<br><span style='font-size: 20px;'>{unique_skus:,}</span>", unsafe_allow_html=True)
 
 # ------------------ SKU SUMMARY ------------------
-# Step 1: Get order_id to product_sku mapping from deduped orders only
-dedup_orders = (
-    filtered_df
-    .sort_values('order_value', ascending=False)
-    .drop_duplicates(subset='order_id')
-)
-
-# Step 2: Create order→SKU mapping for unique order count per SKU
-sku_orders = dedup_orders[['order_id', 'product_sku']].drop_duplicates()
-sku_order_counts = sku_orders['product_sku'].value_counts().rename("unique_orders").reset_index()
-sku_order_counts.columns = ['product_sku', 'unique_orders']
-
-# Step 3: Get full sold_qty (sum from all rows, not deduped)
-sku_qty = (
-    filtered_df.groupby(['product_sku', 'product_name'])
-    .agg(sold_qty=('product_qty', 'sum'))
-    .reset_index()
+# Sold qty + unique orders (orders counted on their deciding line) in one grouped pass,
+# memoised per date range × channels so changing Top-N alone recomputes nothing
+leaderboards = dataset.derived("sku_leaderboards", lambda f: LeaderboardMemo(), frame=frame)
+leaderboard = leaderboards.get(
+    leaderboard_key(start_date, end_date, selected_channels),
+    lambda: SkuLeaderboard.from_lines(filtered_df, headers.header_line),
 )
 
-# Step 4: Merge both
-sku_summary = pd.merge(sku_qty, sku_order_counts, on='product_sku', how='left').fillna(0)
-sku_summary['unique_orders'] = sku_summary['unique_orders'].astype(int)
-
 # ------------------ Display Top/Bottom N SKUs ------------------
 st.markdown(f"### 🔝 Top {top_n} Most Sold SKUs")
-top_skus = (
-    sku_summary.sort_values(by='sold_qty', ascending=False)
-    .head(top_n)[['product_sku', 'product_name', 'sold_qty', 'unique_orders']]
-)
+top_skus = leaderboard.top(top_n)
 st.dataframe(top_skus, use_container_width=True)
 
 st.markdown(f"### 🔻 Bottom {top_n} Least Sold SKUs")
-bottom_skus = (
-    sku_summary.sort_values(by='sold_qty', ascending=True)
-    .head(top_n)[['product_sku', 'product_name', 'sold_qty', 'unique_orders']]
-)
+bottom_skus = leaderboard.bottom(top_n)
 st.dataframe(bottom_skus, use_container_width=True)
 
 # ------------------ RAW DATA + DOWNLOAD ------------------
 st.markdown("### 🧾 Sample Raw Data")
 st.dataframe(filtered_df.head(10), use_container_width=True)
 
-csv_data = filtered_df.to_csv(index=False).encode("utf-8")
-st.download_button(
-    label="⬇️ Download Full Filtered Channel Data as CSV",
-    data=csv_data,
-    file_name=f"filtered_channel_orders.csv",
-    mime="text/csv"
+# Year-long ranges are hundreds of thousands of lines → compressed formats by default, written in chunks
+export_format = st.radio("Export format", list(DATA_EXPORT_FORMATS), horizontal=True, key="channel_orders_format")
+build_export, extension, export_mime = DATA_EXPORT_FORMATS[export_format]
+# filtered_df is a new frame every rerun → key the export on the frame it came from (a token
+# minted once per dataset refresh, nothing hashed) and the filters, not on its contents
+export_fingerprint = (
+    dataset.derived("frame_token", lambda f: uuid.uuid4().hex, frame=frame),
+    months_ago(12)(),
+    leaderboard_key(start_date, end_date, selected_channels),
+)
+lazy_download_button(
+    f"⬇️ Download Full Filtered Channel Data ({export_format})",
+    build_export,
+    filtered_df,
+    file_name=f"filtered_channel_orders{extension}",
+    mime=export_mime,
+    key="channel_orders_export",
+    fingerprint=export_fingerprint,
 )
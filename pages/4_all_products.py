@@ -1,9 +1,13 @@
 import streamlit as st
 st.set_page_config(page_title="📦 All Products", layout="wide")
 
-import pandas as pd
-from utils.db import connect_db
+import numpy as np
+from utils.result_cache import cached_query  # ✅ Results shared across app instances
 from utils.auth_utils import run_auth  # ✅ Centralized login
+from utils.lazy_downloads import lazy_csv_download  # ✅ CSV built on click, cached by data
+from utils.paginated_grid import data_grid  # ✅ Only the visible page is sent
+from utils.facet_index import get_facet_index  # ✅ Bitmap facets with live counts
+from utils.product_search import get_search_index, SEARCH_LIMIT  # ✅ Ranked product search
 
 #-------------------------------------------------------
 # 🔐 Run login
@@ -13,80 +17,66 @@ name, username = run_auth()
 st.title("📦 Products Information Portal")
 
 # --------------------- LOAD DATA ---------------------
-@st.cache_data
+@st.cache_data(ttl=600)
 def load_data():
-    conn = connect_db()
-    return pd.read_sql("SELECT * FROM Products", conn)
+    return cached_query("SELECT * FROM Products", tables=("Products",))
 
 df = load_data()
-temp_df = df.copy()
 
 # --------------------- FILTER SECTION ---------------------
 st.markdown("### 🔍 Filter Products")
 
-# Row 1 filters
-col1, col2, col3, col4 = st.columns(4)
-with col1:
-    skus = st.multiselect("Product SKU", sorted(temp_df['product_sku'].dropna().unique()))
-with col2:
-    categories = st.multiselect("Category", sorted(temp_df['product_category'].dropna().unique()))
-with col3:
-    names = st.multiselect("Product Name", sorted(temp_df['product_name'].dropna().unique()))
-with col4:
-    descriptions = st.multiselect("Description", sorted(temp_df['product_description'].dropna().unique()))
+# Facet rows as laid out on the page: (column, label)
+FACET_ROWS = [
+    [("product_sku", "Product SKU"), ("product_category", "Category"),
+     ("product_name", "Product Name"), ("product_description", "Description")],
+    [("product_source_country", "Source Country"), ("product_commodity_code", "Commodity Code"),
+     ("ean_barcode", "EAN Barcode"), ("product_composition", "Product Composition")],
+    [("brand_name", "Brand Name"), ("customs_description", "Customs Description")],
+]
+FACET_COLUMNS = [col for row in FACET_ROWS for col, _ in row]
 
-# Apply first set of filters
-filters = {
-    "product_sku": skus,
-    "product_category": categories,
-    "product_name": names,
-    "product_description": descriptions
-}
-for col, values in filters.items():
-    if values:
-        temp_df = temp_df[temp_df[col].isin(values)]
+# Value → row bitmaps, built once per catalog version; options and counts come from bitmap ANDs
+facets = get_facet_index(df, FACET_COLUMNS)
+selections = {col: st.session_state.get(f"facet:{col}", []) for col in FACET_COLUMNS}
 
-# Row 2 filters
-col5, col6, col7, col8 = st.columns(4)
-with col5:
-    countries = st.multiselect("Source Country", sorted(temp_df['product_source_country'].dropna().unique()))
-with col6:
-    commodity_codes = st.multiselect("Commodity Code", sorted(temp_df['product_commodity_code'].dropna().unique()))
-with col7:
-    ean = st.multiselect("EAN Barcode", sorted(temp_df['ean_barcode'].dropna().unique()))
-with col8:
-    composition = st.multiselect("Product Composition", sorted(temp_df['product_composition'].dropna().unique()))
+# Ranked matches from the prebuilt search index; facets then narrow the matches
+query = st.text_input(
+    "🔎 Search products",
+    placeholder="SKU, name, description, EAN barcode or customs description",
+    key="product_search",
+).strip()
+search_rows, search_bitmap = None, None
+if query:
+    search_rows, _ = get_search_index(df).search(query, limit=SEARCH_LIMIT)
+    search_bitmap = facets.rows_bitmap(search_rows)
+    capped = f" (best {SEARCH_LIMIT:,} shown)" if len(search_rows) == SEARCH_LIMIT else ""
+    st.caption(f"{len(search_rows):,} matches for “{query}”{capped}")
 
-# Row 3 filters
-col9, col10 = st.columns(2)
-with col9:
-    brand = st.multiselect("Brand Name", sorted(temp_df['brand_name'].dropna().unique()))
-with col10:
-    customs = st.multiselect("Customs Description", sorted(temp_df['customs_description'].dropna().unique()))
+for row in FACET_ROWS:
+    for (col, label), slot in zip(row, st.columns(len(row))):
+        counts = facets.facet_counts(col, selections, base=search_bitmap)
+        with slot:
+            # Options and labels must not change between runs: Streamlit derives the widget id
+            # from them, and a new id drops the selection. Live counts go in the caption instead.
+            selections[col] = st.multiselect(label, facets.values(col), key=f"facet:{col}")
+            picked = ", ".join(f"{v} ({counts.get(v, 0):,})" for v in selections[col])
+            st.caption(f"{len(counts):,} values match" + (f" · {picked}" if picked else ""))
 
-# Apply extra filters
-extra_filters = {
-    "product_source_country": countries,
-    "product_commodity_code": commodity_codes,
-    "ean_barcode": ean,
-    "product_composition": composition,
-    "brand_name": brand,
-    "customs_description": customs
-}
-for col, values in extra_filters.items():
-    if values:
-        temp_df = temp_df[temp_df[col].isin(values)]
+matching = facets.matching_rows(selections, base=search_bitmap)
+if search_rows is not None:
+    matching = search_rows[np.isin(search_rows, matching)]  # keep search rank order
+temp_df = df.iloc[matching]
 
 # --------------------- RESULTS ---------------------
 if temp_df.empty:
     st.warning("⚠️ No records match your filters.")
 else:
-    st.dataframe(temp_df, use_container_width=True)
+    data_grid(temp_df, key="products_grid", label="products")
 
-    csv = temp_df.to_csv(index=False).encode('utf-8')
-    st.download_button(
-        label="⬇️ Download Filtered Products CSV",
-        data=csv,
+    lazy_csv_download(
+        "⬇️ Download Filtered Products CSV",
+        temp_df,
         file_name="filtered_products.csv",
-        mime="text/csv"
+        key="filtered_products_csv",
     )
@@ -6,6 +6,8 @@ from datetime import datetime
 from utils.supplier_cleaning import clean_supplier_excel
 from utils.supplier_analysis import generate_insights
 from utils.auth_utils import run_auth  # ✅ Reuse centralized login logic
+from utils.exports import Sheet, excel_bytes, XLSX_MIME  # ✅ Streaming xlsx export
+from utils.lazy_downloads import lazy_csv_download, lazy_download_button  # ✅ Built on click, cached by data
 
 #-------------------------------------------------------
 # 🔐 User authentication
@@ -44,8 +46,8 @@ with tab1:
             with col_layout[idx % 2]:
                 st.subheader(f"🔹 Channel: {channel}")
                 st.dataframe(summary, use_container_width=True)
-                csv = summary.to_csv(index=False).encode('utf-8')
-                st.download_button("⬇️ Download CSV", data=csv, file_name=f"{channel}_summary.csv", mime='text/csv')
+                lazy_csv_download("⬇️ Download CSV", summary, file_name=f"{channel}_summary.csv",
+                                  key=f"invoice_summary_csv:{channel}")
 
 # ------------------ TAB 2: Mintsoft vs Opera Delta Report ------------------
 with tab2:
@@ -130,14 +132,24 @@ with tab2:
 
             st.subheader("📌 Final Delta Report Preview")
             st.dataframe(final_report, use_container_width=True)
-            csv = final_report.to_csv(index=False).encode("utf-8")
             today_str = datetime.now().strftime("%d-%b-%Y")
-            st.download_button(
-                "⬇️ Download CSV",
-                data=csv,
-                file_name=f"Final_Delta_Report_{today_str}.csv",
-                mime="text/csv"
-            )
+            dl_csv, dl_xlsx = st.columns(2)
+            with dl_csv:
+                lazy_csv_download(
+                    "⬇️ Download CSV",
+                    final_report,
+                    file_name=f"Final_Delta_Report_{today_str}.csv",
+                    key="delta_report_csv"
+                )
+            with dl_xlsx:
+                lazy_download_button(
+                    "⬇️ Download Excel",
+                    lambda report: excel_bytes([Sheet("Delta Report", report, formats={'Quantity': "int"})]),
+                    final_report,
+                    file_name=f"Final_Delta_Report_{today_str}.xlsx",
+                    mime=XLSX_MIME,
+                    key="delta_report_xlsx"
+                )
 
         except Exception as e:
             st.error(f"❌ Error processing files: {e}")
@@ -173,3 +185,23 @@ with tab3:
 
         st.subheader("🔍 Products Sold Only Once")
         st.dataframe(insights["One-Time Sellers"])
+
+        insight_tables = ["Top Sellers", "Slow Sellers", "Top Value Products", "Returns", "One-Time Sellers"]
+        overview = pd.DataFrame({
+            "Metric": ["Total Products", "Units Sold", "Net Sales (Inc VAT)", "Avg Price Per Unit"],
+            "Value": [
+                insights["Total Unique Products"], insights["Total Units Sold"],
+                insights["Total Net Sales (Inc VAT)"], insights["Average Price per Unit Sold"],
+            ],
+        })
+        lazy_download_button(
+            "⬇️ Download Insights Excel",
+            lambda tables: excel_bytes(
+                [Sheet("Overview", tables[0], widths={"Metric": 25})]
+                + [Sheet(title, table) for title, table in zip(insight_tables, tables[1:])]
+            ),
+            [overview] + [insights[title] for title in insight_tables],
+            file_name=f"Supplier_Sales_Insights_{datetime.now().strftime('%d-%b-%Y')}.xlsx",
+            mime=XLSX_MIME,
+            key="supplier_insights_xlsx"
+        )
@@ -2,16 +2,19 @@ import streamlit as st
 st.set_page_config(page_title="📊 Product Sales Analysis", layout="wide")
 
 import pandas as pd
-import pyodbc
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta
-import plotly.express as px
+from utils.charts import bar_chart, box_chart, pie_chart  # ✅ Downsampled, cached figures
 import streamlit_authenticator as stauth
 from auth_config import credentials
 
 #--------------------------------------------------------------------------
 # Setup login form
 from utils.auth_utils import run_auth
+from utils.orders_data import orders_view
+from utils.date_index import date_slice
+from utils.lazy_downloads import lazy_csv_download  # ✅ CSVs built on click, cached by data
+from utils.paginated_grid import data_grid  # ✅ Only the visible page is sent
 name, username = run_auth()
 
 st.title("📦 Product Sales History & Dead Stock")
@@ -25,35 +28,17 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# ------------------ DB CONNECTION ------------------
-def connect_db():
-    return pyodbc.connect(
-        "DRIVER={ODBC Driver 17 for SQL Server};"
-        "SERVER=mptcecommerce-sql-server.database.windows.net;"
-        "DATABASE=mptcecommerce-db;"
-        "UID=mptcadmin;"
-        "PWD=Mptc@2025;"
-        "Connection Timeout=60"
-    )
-
 # ------------------ LOAD DATA ------------------
-@st.cache_data
 def load_data():
-    conn = connect_db()
-    query = """
-    SELECT od.order_id, od.product_sku, od.product_name, p.product_category,
-           od.order_channel, od.order_date, od.product_qty, od.product_price,
-           od.cost_price
-    FROM OrdersDespatch od
-    LEFT JOIN Products p ON od.product_sku = p.product_sku
-    WHERE od.order_date >= '2024-01-01'
-    """
-    df = pd.read_sql(query, conn)
-    conn.close()
-    df['order_date'] = pd.to_datetime(df['order_date'])
-    df['sale_amount'] = df['product_qty'] * df['product_price']
-    df['cost_amount'] = df['product_qty'] * df['cost_price']
-    return df
+    df = orders_view([
+        'order_id', 'product_sku', 'product_name', 'product_category', 'order_channel',
+        'order_date', 'product_qty', 'product_price', 'cost_price'
+    ], date_column='order_date')  # rows in order-date order → date filters are binary searches
+    # New frame with the derived columns; the shared dataset is never written to
+    return df.assign(
+        sale_amount=df['product_qty'] * df['product_price'],
+        cost_amount=df['product_qty'] * df['cost_price'],
+    )
 
 df = load_data()
 if df.empty:
@@ -101,7 +86,7 @@ with tab1:
     with col2: name_input = st.text_input("🔍 Name Filter")
     with col3: cat_input = st.text_input("🔍 Category Filter")
 
-    filtered_df = df.copy()
+    filtered_df = date_slice(df, 'order_date', start_date, end_date)
     if sku_input:
         filtered_df = filtered_df[filtered_df['product_sku'].str.contains(sku_input, case=False, na=False)]
     if name_input:
@@ -109,7 +94,6 @@ with tab1:
     if cat_input:
         filtered_df = filtered_df[filtered_df['product_category'].str.contains(cat_input, case=False, na=False)]
 
-    filtered_df = filtered_df[filtered_df['order_date'].between(start_date, end_date)]
     if filtered_df.empty:
         st.warning("No data for selected filters.")
         st.stop()
@@ -153,7 +137,7 @@ with tab1:
     # ---- Channel Summary Table ----
     st.markdown("### 📊 Channel-wise Sales")
     summary = (
-        filtered_df.groupby('order_channel')
+        filtered_df.groupby('order_channel', observed=True)
         .agg(
             total_orders=('order_id', pd.Series.nunique),
             total_qty=('product_qty', 'sum'),
@@ -177,16 +161,15 @@ with tab1:
     st.dataframe(styled_channel, use_container_width=True, height=350)
 
     # ---- Weekly History (Qty & Revenue) ----
-    past_df = filtered_df.copy()
     today = df['order_date'].max()
-    past_df = past_df[past_df['order_date'] >= today - timedelta(days=365)].copy()
+    past_df = date_slice(filtered_df, 'order_date', today - timedelta(days=365)).copy()
     past_df['Month'] = past_df['order_date'].dt.strftime("%b-%y")
     past_df['Week'] = "W" + past_df['order_date'].dt.isocalendar().week.astype(str)
     past_df['SKU'] = past_df['product_sku']
     past_df['Name'] = past_df['product_name']
 
     def make_history_matrix(df, value_col):
-        pivot = df.pivot_table(index=['Month', 'Week'], columns='SKU', values=value_col, aggfunc='sum')
+        pivot = df.pivot_table(index=['Month', 'Week'], columns='SKU', values=value_col, aggfunc='sum', observed=True)
         pivot = pivot.sort_index(ascending=False).fillna("-")
         sku_names = df[['SKU', 'Name']].drop_duplicates().set_index('SKU')['Name'].to_dict()
         pivot.columns = [f"{sku} | {sku_names.get(sku, '')}" for sku in pivot.columns]
@@ -206,16 +189,16 @@ with tab1:
     with row1:
         st.markdown("### 📄 Raw Filtered Sales Data")
     with row2:
-        csv = filtered_df.to_csv(index=False).encode("utf-8")
-        st.download_button("⬇️ Download CSV", csv, file_name="filtered_sales_data.csv", mime="text/csv", use_container_width=True)
+        lazy_csv_download("⬇️ Download CSV", filtered_df, file_name="filtered_sales_data.csv",
+                          key="filtered_sales_csv", use_container_width=True)
 
-    st.dataframe(filtered_df, use_container_width=True, height=350)
+    data_grid(filtered_df, key="sales_lines_grid", height=350, label="sales lines")
 
 # ------------------ TAB 2: DEAD STOCK ------------------
 with tab2:
     
     # 1. Calculate last sold dates
-    last_sold = df.groupby(['product_sku', 'product_name'])['order_date'].max().reset_index()
+    last_sold = df.groupby(['product_sku', 'product_name'], observed=True)['order_date'].max().reset_index()
     last_sold['Days Since Last Sale'] = (pd.Timestamp.now().normalize() - last_sold['order_date']).dt.days
     last_sold['Last Sold'] = last_sold['order_date'].dt.strftime('%Y-%m-%d')
 
@@ -289,12 +272,11 @@ with tab2:
             with row1:
                 st.markdown("### 🧾 Dead Stock List")
             with row2:
-                csv_dead = dead_stock.to_csv(index=False).encode("utf-8")
-                st.download_button(
+                lazy_csv_download(
                     "⬇️ Download CSV",
-                    csv_dead,
+                    dead_stock,
                     file_name="dead_stock.csv",
-                    mime="text/csv",
+                    key="dead_stock_csv",
                     use_container_width=True
                 )
     
@@ -323,29 +305,29 @@ with tab2:
     ]
     
     # 1. Bar Chart
-    bar_fig = px.bar(
+    bar_fig = bar_chart(
         bucket_counts,
         x="Bucket",
         y="Unique SKU Count",
         title="🧊 Unsold SKU Count by Time Bucket",
         text="Unique SKU Count",
-        category_orders={"Bucket": bucket_order}
+        category_orders={"Bucket": bucket_order},
+        traces={"textposition": "outside"},
+        layout={"height": 700},
     )
-    bar_fig.update_traces(textposition="outside")
-    bar_fig.update_layout(height=700)
     
     # 2. Box Plot
     box_data = last_sold.dropna(subset=['Bucket'])
-    box_fig = px.box(
+    box_fig = box_chart(
         box_data,
         x="Bucket",
         y="Days Since Last Sale",
         points="all",
         color="Bucket",
         title="📦 Days Since Last Sale Distribution",
-        category_orders={"Bucket": bucket_order}
+        category_orders={"Bucket": bucket_order},
+        layout={"height": 700},
     )
-    box_fig.update_layout(height=700)
     
     # Display side-by-side
     col1, col2 = st.columns(2)
@@ -359,7 +341,7 @@ with tab2:
     dead_skus = pd.merge(last_sold.dropna(subset=['Bucket']), sku_cat_map, on='product_sku', how='left')
     
     category_counts = (
-        dead_skus.groupby('product_category')['product_sku']
+        dead_skus.groupby('product_category', observed=True)['product_sku']
         .nunique()
         .reset_index()
         .rename(columns={'product_sku': 'Unsold SKU Count'})
@@ -368,15 +350,15 @@ with tab2:
     
     st.dataframe(category_counts, use_container_width=True)
     
-    fig_cat = px.bar(
+    fig_cat = bar_chart(
         category_counts,
         x="product_category",
         y="Unsold SKU Count",
         title="📊 Unsold SKUs by Category",
-        text="Unsold SKU Count"
+        text="Unsold SKU Count",
+        traces={"textposition": "outside"},
+        layout={"xaxis_tickangle": -45, "height": 500},
     )
-    fig_cat.update_traces(textposition="outside")
-    fig_cat.update_layout(xaxis_tickangle=-45, height=500)
     st.plotly_chart(fig_cat, use_container_width=True)
 
 
@@ -392,7 +374,7 @@ with tab3:
     with col3: cat_filter = st.text_input("Category")
 
     # Filter data from already-loaded df
-    df_filtered = df[df['order_date'].between(start_date, end_date)].copy()
+    df_filtered = date_slice(df, 'order_date', start_date, end_date).copy()
     if sku_filter:
         df_filtered = df_filtered[df_filtered['product_sku'].str.contains(sku_filter, case=False, na=False)]
     if name_filter:
@@ -402,7 +384,7 @@ with tab3:
 
     # ------------------ ABC ANALYSIS BY QTY ------------------
     def compute_abc_qty(df):
-        qty_df = df.groupby(['product_sku', 'product_name'])['product_qty'].sum().reset_index()
+        qty_df = df.groupby(['product_sku', 'product_name'], observed=True)['product_qty'].sum().reset_index()
         qty_df = qty_df.sort_values(by='product_qty', ascending=False).reset_index(drop=True)
         qty_df['cumulative_qty'] = qty_df['product_qty'].cumsum()
         total_qty = qty_df['product_qty'].sum()
@@ -426,7 +408,7 @@ with tab3:
     col1, col2 = st.columns([0.5, 0.5])
 
     with col1:
-        pie = px.pie(
+        pie = pie_chart(
             abc_all.groupby('ABC_Class')['product_qty'].sum().reset_index(),
             names='ABC_Class',
             values='product_qty',
@@ -437,8 +419,7 @@ with tab3:
 
     with col2:
         st.dataframe(abc_all, use_container_width=True, height=400)
-        csv_all = abc_all.to_csv(index=False).encode("utf-8")
-        st.download_button("⬇️ Download ABC Table", csv_all, file_name="abc_all_qty.csv", mime="text/csv")
+        lazy_csv_download("⬇️ Download ABC Table", abc_all, file_name="abc_all_qty.csv", key="abc_all_csv")
 
     # ------------------ SECTION: A, B, C CATEGORY ------------------
     def show_category_section(letter):
@@ -448,15 +429,15 @@ with tab3:
 
         with col1:
             if not df_cat.empty:
-                pie = px.pie(df_cat, names='product_sku', values='product_qty', title=f"Category {letter} - Qty Share", hole=0.45)
+                pie = pie_chart(df_cat, names='product_sku', values='product_qty', title=f"Category {letter} - Qty Share", hole=0.45)
                 st.plotly_chart(pie, use_container_width=True)
             else:
                 st.info(f"No products found in Category {letter}.")
 
         with col2:
             st.dataframe(df_cat, use_container_width=True, height=400)
-            csv_cat = df_cat.to_csv(index=False).encode("utf-8")
-            st.download_button(f"⬇️ Download Category {letter}", csv_cat, file_name=f"abc_{letter}_qty.csv", mime="text/csv")
+            lazy_csv_download(f"⬇️ Download Category {letter}", df_cat, file_name=f"abc_{letter}_qty.csv",
+                              key=f"abc_{letter}_csv")
 
     show_category_section('A')
     show_category_section('B')
@@ -472,7 +453,7 @@ with tab4:
     with col2: name_filter = st.text_input("Name", key="channel_name")
     with col3: cat_filter = st.text_input("Category", key="channel_cat")
 
-    df_filtered = df[df['order_date'].between(start_date, end_date)].copy()
+    df_filtered = date_slice(df, 'order_date', start_date, end_date).copy()
     if sku_filter:
         df_filtered = df_filtered[df_filtered['product_sku'].str.contains(sku_filter, case=False, na=False)]
     if name_filter:
@@ -483,7 +464,7 @@ with tab4:
     # ------------------ ABC BY TOTAL QTY SOLD (BY CHANNEL) ------------------
     st.markdown("### 🔢 ABC of All Channels by Quantity Sold")
 
-    qty_by_channel = df_filtered.groupby('order_channel')['product_qty'].sum().reset_index().rename(columns={'product_qty': 'total_qty'})
+    qty_by_channel = df_filtered.groupby('order_channel', observed=True)['product_qty'].sum().reset_index().rename(columns={'product_qty': 'total_qty'})
     qty_by_channel = qty_by_channel.sort_values(by='total_qty', ascending=False).reset_index(drop=True)
     qty_by_channel['cumulative_qty'] = qty_by_channel['total_qty'].cumsum()
     total_qty = qty_by_channel['total_qty'].sum()
@@ -496,7 +477,7 @@ with tab4:
 
     qty_by_channel['ABC_Class'] = qty_by_channel['cumulative_pct'].apply(label_class)
 
-    pie_qty = px.pie(
+    pie_qty = pie_chart(
         qty_by_channel,
         names='order_channel', values='total_qty', title="ABC by Quantity Sold (Channels)", hole=0.45,
         color='ABC_Class'
@@ -507,8 +488,8 @@ with tab4:
         st.plotly_chart(pie_qty, use_container_width=True)
     with col2:
         st.dataframe(qty_by_channel, use_container_width=True, height=400)
-        csv_qty = qty_by_channel.to_csv(index=False).encode("utf-8")
-        st.download_button("⬇️ Download ABC Qty Table", csv_qty, file_name="abc_qty_by_channel.csv", mime="text/csv")
+        lazy_csv_download("⬇️ Download ABC Qty Table", qty_by_channel, file_name="abc_qty_by_channel.csv",
+                          key="abc_qty_channel_csv")
 
     # ------------------ ABC BY REVENUE (BY CHANNEL) ------------------
     st.markdown("### 💰 ABC of All Channels by Revenue")
@@ -519,14 +500,14 @@ with tab4:
         'sale_amount': 'sum'
     }).reset_index()
 
-    revenue_by_channel = order_revenue.groupby('order_channel')['sale_amount'].sum().reset_index().rename(columns={'sale_amount': 'total_revenue'})
+    revenue_by_channel = order_revenue.groupby('order_channel', observed=True)['sale_amount'].sum().reset_index().rename(columns={'sale_amount': 'total_revenue'})
     revenue_by_channel = revenue_by_channel.sort_values(by='total_revenue', ascending=False).reset_index(drop=True)
     revenue_by_channel['cumulative_rev'] = revenue_by_channel['total_revenue'].cumsum()
     total_rev = revenue_by_channel['total_revenue'].sum()
     revenue_by_channel['cumulative_pct'] = revenue_by_channel['cumulative_rev'] / total_rev
     revenue_by_channel['ABC_Class'] = revenue_by_channel['cumulative_pct'].apply(label_class)
 
-    pie_rev = px.pie(
+    pie_rev = pie_chart(
         revenue_by_channel,
         names='order_channel', values='total_revenue', title="ABC by Revenue (Channels)", hole=0.45,
         color='ABC_Class'
@@ -537,18 +518,18 @@ with tab4:
         st.plotly_chart(pie_rev, use_container_width=True)
     with col2:
         st.dataframe(revenue_by_channel, use_container_width=True, height=400)
-        csv_rev = revenue_by_channel.to_csv(index=False).encode("utf-8")
-        st.download_button("⬇️ Download ABC Revenue Table", csv_rev, file_name="abc_revenue_by_channel.csv", mime="text/csv")
+        lazy_csv_download("⬇️ Download ABC Revenue Table", revenue_by_channel, file_name="abc_revenue_by_channel.csv",
+                          key="abc_revenue_channel_csv")
 
     # ------------------ INDIVIDUAL CHANNEL TABLES (BY QTY ABC) ------------------
     st.markdown("### 🧾 Individual Channel Tables (by Quantity Sold)")
-    grouped = df_filtered.groupby(['order_channel', 'product_sku', 'product_name'])['product_qty'].sum().reset_index()
+    grouped = df_filtered.groupby(['order_channel', 'product_sku', 'product_name'], observed=True)['product_qty'].sum().reset_index()
     grouped = grouped.sort_values(['order_channel', 'product_qty'], ascending=[True, False])
 
     def assign_abc_per_channel(df):
         df = df.copy()
-        df['cumulative'] = df.groupby('order_channel')['product_qty'].cumsum()
-        df['total'] = df.groupby('order_channel')['product_qty'].transform('sum')
+        df['cumulative'] = df.groupby('order_channel', observed=True)['product_qty'].cumsum()
+        df['total'] = df.groupby('order_channel', observed=True)['product_qty'].transform('sum')
         df['cumulative_pct'] = df['cumulative'] / df['total']
         df['ABC_Class'] = df['cumulative_pct'].apply(label_class)
         return df
@@ -559,6 +540,4 @@ with tab4:
         st.markdown(f"#### 📦 Channel: {ch}")
         ch_df = channel_sku_abc[channel_sku_abc['order_channel'] == ch][['product_sku', 'product_name', 'product_qty', 'ABC_Class']]
         st.dataframe(ch_df, use_container_width=True, height=300)
-        csv_ch = ch_df.to_csv(index=False).encode("utf-8")
-        st.download_button(
-            f"⬇️ Download {ch} ABC", csv_ch, file_name=f"abc_qty_{ch}.csv", mime="text/csv")
+        lazy_csv_download(f"⬇️ Download {ch} ABC", ch_df, file_name=f"abc_qty_{ch}.csv", key=f"abc_channel_csv:{ch}")
@@ -1,127 +1,64 @@
 import streamlit as st
 st.set_page_config(page_title="📈 Inventory Forecast & Planning", layout="wide")
 
-from io import BytesIO
 import pandas as pd
-import pyodbc
 from datetime import datetime, timedelta
-from io import StringIO
-import xlsxwriter
 
 #--------------------------------------------------------------------------
 # Setup login form
 from utils.auth_utils import run_auth
+from utils.orders_data import orders_view
+from utils.date_index import date_slice, window_sums
+from utils.html_tables import table_css, paginate, paginated_table  # ✅ Paged HTML tables
+from utils.exports import Sheet, excel_bytes, XLSX_MIME  # ✅ Streaming xlsx export
+from utils.lazy_downloads import lazy_csv_download, lazy_download_button  # ✅ Built on click, cached by data
 name, username = run_auth()
 
 st.title("🗓️ Inventory Forecast & Planning")
 
-# ------------------ DB CONNECTION ------------------
-def connect_db():
+# ------------------ LOAD DATA ------------------
+def load_data():
     try:
-        return pyodbc.connect(
-            "DRIVER={ODBC Driver 17 for SQL Server};"
-            "SERVER=mptcecommerce-sql-server.database.windows.net;"
-            "DATABASE=mptcecommerce-db;"
-            "UID=mptcadmin;"
-            "PWD=Mptc@2025;"
-            "Connection Timeout=60"
+        return orders_view(
+            ['order_id', 'product_sku', 'product_name', 'product_category', 'order_date', 'product_qty'],
+            date_column='order_date',  # rows in order-date order → date filters are binary searches
         )
     except Exception as e:
         st.error(f"❌ Database connection failed: {e}")
-        return None
-
-# ------------------ LOAD DATA ------------------
-@st.cache_data
-def load_data():
-    conn = connect_db()
-    if conn is None:
         return pd.DataFrame()
-    query = """
-    SELECT 
-        od.order_id,
-        od.product_sku,
-        od.product_name,
-        p.product_category,
-        od.order_date,
-        od.product_qty
-    FROM OrdersDespatch od
-    LEFT JOIN Products p ON od.product_sku = p.product_sku
-    WHERE od.order_date >= '2024-01-01'
-    """
-    df = pd.read_sql(query, conn)
-    conn.close()
-    df['order_date'] = pd.to_datetime(df['order_date'])
-    return df
 
 # ------------------ UTILITY: EXPORT SALES MATRICES TO EXCEL ------------------
-def export_sales_matrices_to_excel(matrices_dict):
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        for sku, (product_name, sales_data) in matrices_dict.items():
-            # Find max week length across months
-            max_weeks = max(len(weeks) for weeks in sales_data.values())
-            
-            # Pad each month’s week list with zeros
-            padded_sales_data = {
-                month: weeks + [0] * (max_weeks - len(weeks))
-                for month, weeks in sales_data.items()
-            }
-            
-            matrix_df = pd.DataFrame(padded_sales_data)
-            matrix_df.index = [f"w{i+1}" for i in range(max_weeks)]
-            matrix_df = matrix_df.T  # Transpose to get months as rows
-
-            # Safe sheet name
-            sheet_name = str(sku)[:31]
-            matrix_df.to_excel(writer, sheet_name=sheet_name)
-    output.seek(0)
-    return output
-
-# ------------------ UTILITY: GENERATE HTML TABLE ------------------
-def generate_html_table(df, title, highlight_cols=None):
-    highlight_cols = highlight_cols or []
-    table_style = """
-    <style>
-    .custom-table {
-        border-collapse: collapse;
-        width: 100%;
-        font-size: 14px;
-    }
-    .custom-table th, .custom-table td {
-        border: 1px solid #ccc;
-        padding: 6px 10px;
-        text-align: center;
-    }
-    .custom-table th {
-        background-color: #f2f2f2;
-    }
-    .custom-table .highlight {
-        background-color: #c9daf8;
-        font-weight: bold;
-    }
-    </style>
-    """
-
-    # Only add heading if title is not empty
-    html = table_style
-    if title:
-        html += f"<h4 style='margin-bottom: 8px;'>{title}</h4>"
-
-    html += "<table class='custom-table'><thead><tr>"
-    for col in df.columns:
-        html += f"<th>{col}</th>"
-    html += "</tr></thead><tbody>"
-
-    for _, row in df.iterrows():
-        html += "<tr>"
-        for col in df.columns:
-            val = row[col]
-            style = "highlight" if col in highlight_cols else ""
-            html += f"<td class='{style}'>{round(val, 1) if isinstance(val, float) else val}</td>"
-        html += "</tr>"
-
-    html += "</tbody></table>"
-    return html
+PER_SKU_SHEETS_MAX = 50  # above this many SKUs the export defaults to the single long-format sheet
+
+def sales_matrix_sheets(matrices_dict):
+    """One sheet per SKU: months as rows, w1..wN as columns (short months padded with 0)."""
+    sheets = []
+    for sku, (product_name, sales_data) in matrices_dict.items():
+        max_weeks = max(len(weeks) for weeks in sales_data.values())
+        matrix_df = pd.DataFrame(
+            [weeks + [0] * (max_weeks - len(weeks)) for weeks in sales_data.values()],
+            index=pd.Index(list(sales_data), name="month"),
+            columns=[f"w{i+1}" for i in range(max_weeks)],
+        )
+        sheets.append(Sheet(sku, matrix_df, index=True))
+    return sheets
+
+
+def sales_matrix_long_sheet(matrices_dict):
+    """All SKUs on one sheet, one row per SKU × month × week — stays fast for thousands of SKUs."""
+    rows = [
+        (sku, product_name, month, f"w{i+1}", qty)
+        for sku, (product_name, sales_data) in matrices_dict.items()
+        for month, weeks in sales_data.items()
+        for i, qty in enumerate(weeks)
+    ]
+    long_df = pd.DataFrame(rows, columns=['product_sku', 'product_name', 'month', 'week', 'product_qty'])
+    return [Sheet("Sales History", long_df, formats={'product_qty': "int"}, widths={'product_name': 40})]
+
+
+def export_sales_matrices_to_excel(matrices_dict, long_format=False):
+    sheets = sales_matrix_long_sheet(matrices_dict) if long_format else sales_matrix_sheets(matrices_dict)
+    return excel_bytes(sheets)
 
 # ------------------ LOAD DATA ------------------
 df = load_data()
@@ -200,17 +137,16 @@ def calculate_forecast_by_range(df, sku_col, date_col, qty_col, ranges, today):
     df[date_col] = pd.to_datetime(df[date_col])
     result = []
 
-    for sku in df[sku_col].unique():
-        sku_df = df[df[sku_col] == sku]
+    # Each SKU's rows stay in date order → every ±3-day window is two binary searches on a running sum
+    for sku, sku_df in df.groupby(sku_col, observed=True, sort=False):
         row = {"product_sku": sku}
         for days in ranges:
-            base_qty_total = 0
-            for i in range(1, days + 1):
-                target_date = today + timedelta(days=i)
-                past_date = target_date - timedelta(days=365)
-                mask = (sku_df[date_col] >= past_date - timedelta(days=3)) & \
-                       (sku_df[date_col] <= past_date + timedelta(days=3))
-                base_qty_total += sku_df.loc[mask, qty_col].sum()
+            past_dates = [today + timedelta(days=i) - timedelta(days=365) for i in range(1, days + 1)]
+            base_qty_total = window_sums(
+                sku_df, date_col, qty_col,
+                starts=[d - timedelta(days=3) for d in past_dates],
+                ends=[d + timedelta(days=3) for d in past_dates],
+            ).sum()
 
             base_label = f"base_qty_{label_map[days]}"
             forecast_label = f"forecast_qty_{label_map[days]}"
@@ -235,51 +171,45 @@ forecast_summary = forecast_summary.set_index('product_sku').join(product_names)
 
 # Historical sales summaries
 hist_7d = (
-    filtered_df[filtered_df['order_date'] >= today - timedelta(days=6)]
-    .groupby('product_sku')['product_qty'].sum().rename("qty_last_7d")
+    date_slice(filtered_df, 'order_date', today - timedelta(days=6))
+    .groupby('product_sku', observed=True)['product_qty'].sum().rename("qty_last_7d")
 )
 hist_30d = (
-    filtered_df[filtered_df['order_date'] >= today - timedelta(days=29)]
-    .groupby('product_sku')['product_qty'].sum().rename("qty_last_1mo")
+    date_slice(filtered_df, 'order_date', today - timedelta(days=29))
+    .groupby('product_sku', observed=True)['product_qty'].sum().rename("qty_last_1mo")
 )
 hist_90d = (
-    filtered_df[filtered_df['order_date'] >= today - timedelta(days=89)]
-    .groupby('product_sku')['product_qty'].sum().rename("qty_last_3mo")
+    date_slice(filtered_df, 'order_date', today - timedelta(days=89))
+    .groupby('product_sku', observed=True)['product_qty'].sum().rename("qty_last_3mo")
 )
 
 forecast_summary = forecast_summary.set_index('product_sku')
 forecast_summary = forecast_summary.join([hist_7d, hist_30d, hist_90d])
 forecast_summary.reset_index(inplace=True)
-forecast_summary.fillna(0, inplace=True)
+num_cols = forecast_summary.select_dtypes('number').columns
+forecast_summary[num_cols] = forecast_summary[num_cols].fillna(0)
 
 # ------------------ Generate Forecast Table ------------------
-forecast_html = generate_html_table(
-    forecast_summary,
-    title="",
-    highlight_cols=[
-        col for col in forecast_summary.columns if col.startswith("forecast_qty_")
-    ] + [
-        col for col in forecast_summary.columns if col.startswith("base_qty_")
-    ]
-)
+table_css()  # one stylesheet for every table below
+forecast_highlight = [
+    col for col in forecast_summary.columns if col.startswith("forecast_qty_")
+] + [
+    col for col in forecast_summary.columns if col.startswith("base_qty_")
+]
 
 row_f1, row_f2 = st.columns([0.8, 0.2])
 with row_f1:
     st.markdown("<h5>🔮 SKU-Level Sales Forecast</h5>", unsafe_allow_html=True)
 with row_f2:
-    def prepare_forecast_csv(df):
-        return df.to_csv(index=False).encode("utf-8")
-
-    forecast_csv = prepare_forecast_csv(forecast_summary)
-    st.download_button(
-        label="⬇️ Download CSV",
-        data=forecast_csv,
+    lazy_csv_download(
+        "⬇️ Download CSV",
+        forecast_summary,
         file_name="forecast_summary.csv",
-        mime="text/csv",
+        key="forecast_summary_csv",
         use_container_width=True
     )
 
-st.markdown(forecast_html, unsafe_allow_html=True)
+paginated_table(forecast_summary, key="forecast_page", highlight_cols=forecast_highlight)
 
 # ------------------ Generate Inventory Table ------------------
 rec_df = forecast_summary[['product_sku', 'product_name'] + [f"forecast_qty_{label_map[d]}" for d in forecast_days_list]].copy()
@@ -296,26 +226,21 @@ main_label = label_map[max(forecast_days_list)]
 rec_df['po_quantity'] = rec_df[f"recommended_inventory_{main_label}"] - rec_df['current_inventory']
 rec_df['po_quantity'] = rec_df['po_quantity'].apply(lambda x: max(0, round(x)))
 
-inventory_html = generate_html_table(
-    rec_df,
-    title="",
-    highlight_cols=[col for col in rec_df.columns if col.startswith("recommended_inventory_")]
-)
+inventory_highlight = [col for col in rec_df.columns if col.startswith("recommended_inventory_")]
 
 row_i1, row_i2 = st.columns([0.8, 0.2])
 with row_i1:
     st.markdown("<h5>🧰 Recommended Inventory Planning</h5>", unsafe_allow_html=True)
 with row_i2:
-    rec_csv = prepare_forecast_csv(rec_df)
-    st.download_button(
-        label="⬇️ Download CSV",
-        data=rec_csv,
+    lazy_csv_download(
+        "⬇️ Download CSV",
+        rec_df,
         file_name="inventory_recommendation.csv",
-        mime="text/csv",
+        key="inventory_recommendation_csv",
         use_container_width=True
     )
 
-st.markdown(inventory_html, unsafe_allow_html=True)
+paginated_table(rec_df, key="inventory_page", highlight_cols=inventory_highlight)
 
 # ------------------ SALES MATRIX HTML TABLES ------------------
 st.markdown(
@@ -324,52 +249,17 @@ st.markdown(
 )
 
 def generate_scrollable_sales_matrix(product_sku, product_name, sales_data):
-    html = f"""
-    <style>
-        .scroll-container {{
-            overflow-x: auto;
-            padding-bottom: 10px;
-        }}
-        .sales-table {{
-            border-collapse: collapse;
-            font-size: 14px;
-            margin-bottom: 30px;
-            min-width: 900px;
-        }}
-        .sales-table th, .sales-table td {{
-            border: 1px solid #999;
-            padding: 6px 10px;
-            text-align: center;
-        }}
-        .sales-table th {{
-            background-color: #f2f2f2;
-        }}
-        .header-row th {{
-            background-color: #d9ead3;
-            font-weight: bold;
-        }}
-    </style>
-
-    <h6>🔹 {product_sku} — {product_name}</h6>
-    <div class="scroll-container">
-    <table class="sales-table">
-        <tr class="header-row">
-    """
-    for month in sales_data.keys():
-        html += f'<th colspan="{len(sales_data[month])}">{month}</th>'
-    html += '</tr><tr>'
-    for month, weeks in sales_data.items():
-        for i in range(1, len(weeks) + 1):
-            html += f'<th>w{i}</th>'
-    html += '</tr><tr>'
-    for month, weeks in sales_data.items():
-        for qty in weeks:
-            html += f'<td>{int(qty)}</td>'
-    html += '</tr><tr>'
-    for month, weeks in sales_data.items():
-        html += f'<td colspan="{len(weeks)}"><b>{int(sum(weeks))}</b></td>'
-    html += '</tr></table></div>'
-    return html
+    months = list(sales_data.items())
+    month_row = "".join(f'<th colspan="{len(weeks)}">{month}</th>' for month, weeks in months)
+    week_row = "".join(f"<th>w{i}</th>" for _, weeks in months for i in range(1, len(weeks) + 1))
+    qty_row = "".join(f"<td>{int(qty)}</td>" for _, weeks in months for qty in weeks)
+    total_row = "".join(f'<td colspan="{len(weeks)}"><b>{int(sum(weeks))}</b></td>' for _, weeks in months)
+    return (
+        f"<h6>🔹 {product_sku} — {product_name}</h6>"
+        f"<div class='mptc-scroll'><table class='mptc-matrix'>"
+        f"<tr class='header-row'>{month_row}</tr><tr>{week_row}</tr><tr>{qty_row}</tr><tr>{total_row}</tr>"
+        f"</table></div>"
+    )
 
 # Sales matrix generation and collection
 all_matrices = {}
@@ -378,7 +268,7 @@ for sku in forecast_summary['product_sku'].unique():
     if sku_df.empty:
         continue
     product_name = sku_df['product_name'].iloc[0]
-    recent_df = sku_df[sku_df['order_date'] >= today - timedelta(days=365)].copy()
+    recent_df = date_slice(sku_df, 'order_date', today - timedelta(days=365)).copy()
     recent_df['month_label'] = recent_df['order_date'].dt.strftime('%b-%y')
     recent_df['week_number'] = recent_df['order_date'].dt.isocalendar().week
     sales_data = {}
@@ -394,15 +284,33 @@ for sku in forecast_summary['product_sku'].unique():
     if not sales_data:
         continue
     all_matrices[sku] = (product_name, sales_data)
-    html_output = generate_scrollable_sales_matrix(sku, product_name, sales_data)
-    st.markdown(html_output, unsafe_allow_html=True)
+
+# Only the selected page of products is rendered; the Excel export below still covers all of them
+matrix_items = list(all_matrices.items())
+matrix_start, matrix_stop = paginate(len(matrix_items), key="sales_matrix_page", page_size=25, label="products")
+st.markdown(
+    "".join(
+        generate_scrollable_sales_matrix(sku, product_name, sales_data)
+        for sku, (product_name, sales_data) in matrix_items[matrix_start:matrix_stop]
+    ),
+    unsafe_allow_html=True,
+)
 
 # Download Excel of all matrices
 if all_matrices:
-    excel_file = export_sales_matrices_to_excel(all_matrices)
-    st.download_button(
-        label="⬇️ Download Sales History Excel",
-        data=excel_file,
+    excel_layout = st.radio(
+        "Excel layout",
+        ["One sheet per SKU", "Single sheet (long format)"],
+        index=0 if len(all_matrices) <= PER_SKU_SHEETS_MAX else 1,
+        horizontal=True,
+        key="sales_matrix_layout",
+    )
+    long_format = excel_layout.startswith("Single")
+    lazy_download_button(
+        "⬇️ Download Sales History Excel",
+        lambda matrices: export_sales_matrices_to_excel(matrices, long_format=long_format),
+        all_matrices,
         file_name="sales_history_matrices.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        mime=XLSX_MIME,
+        key=f"sales_history_xlsx:{'long' if long_format else 'per_sku'}"
     )
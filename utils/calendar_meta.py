@@ -0,0 +1,98 @@
+# utils/calendar_meta.py
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.channel_rollup import get_channel_rollup
+from utils.orders_data import get_orders_dataset
+
+
+def _union(indexes):
+    indexes = [days for days in indexes if len(days)]
+    if not indexes:
+        return pd.DatetimeIndex([])
+    if len(indexes) == 1:
+        return indexes[0]
+    return pd.DatetimeIndex(np.unique(np.concatenate([days.to_numpy() for days in indexes])))
+
+
+class DateCalendar:
+    """Days that have data for one date column, overall and per channel.
+
+    Built from (day, channel) pairs once per source refresh; min / max / latest lookups
+    are precomputed or binary searches, never a scan of order lines.
+    """
+
+    def __init__(self, days_by_channel):
+        self._by_channel = days_by_channel  # channel → sorted unique DatetimeIndex
+        self._all = _union(days_by_channel.values())
+
+    @classmethod
+    def from_pairs(cls, days, channels):
+        pairs = pd.DataFrame({"day": pd.to_datetime(days).dt.normalize(), "channel": channels})
+        pairs = pairs[pairs["day"].notna()]
+        by_channel = {}
+        for channel, group in pairs.groupby("channel", observed=True, dropna=False, sort=False):
+            by_channel[channel] = pd.DatetimeIndex(np.unique(group["day"].to_numpy()))
+        return cls(by_channel)
+
+    @classmethod
+    def from_frame(cls, df, date_column, channel_column="order_channel"):
+        return cls.from_pairs(df[date_column], df[channel_column])
+
+    @property
+    def channels(self):
+        return [c for c in self._by_channel if not pd.isna(c)]
+
+    def _days(self, channels=None):
+        if channels is None:
+            return self._all
+        return _union(self._by_channel[c] for c in channels if c in self._by_channel)
+
+    def available_dates(self, channels=None):
+        return list(self._days(channels))
+
+    def min_date(self, channels=None):
+        if channels is None:
+            return self._all[0] if len(self._all) else None
+        firsts = [self._by_channel[c][0] for c in channels if c in self._by_channel and len(self._by_channel[c])]
+        return min(firsts) if firsts else None
+
+    def max_date(self, channels=None):
+        """Latest date with data (for the given channels)."""
+        if channels is None:
+            return self._all[-1] if len(self._all) else None
+        lasts = [self._by_channel[c][-1] for c in channels if c in self._by_channel and len(self._by_channel[c])]
+        return max(lasts) if lasts else None
+
+
+# ------------------ SHARED CALENDARS ------------------
+# Default: calendars of the shared orders dataset (window since 2024-01-01), memoised per frame.
+# whole_table=True (despatch_date only): the day × channel rollup, which covers all of
+# OrdersDespatch and refreshes incrementally.
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def _whole_table_despatch_calendar():
+    frame = get_channel_rollup().frame()
+    with _memo_lock:
+        cached = _memo.get("despatch_date")
+        if cached is not None and cached[0] is frame:
+            return cached[1]
+    calendar = DateCalendar.from_pairs(frame["despatch_day"], frame["channel"])
+    with _memo_lock:
+        _memo["despatch_date"] = (frame, calendar)
+    return calendar
+
+
+def get_calendar(date_column, whole_table=False):
+    if whole_table:
+        if date_column != "despatch_date":
+            raise ValueError(f"No whole-table calendar for {date_column!r}")
+        return _whole_table_despatch_calendar()
+    return get_orders_dataset().derived(
+        f"calendar:{date_column}", lambda frame: DateCalendar.from_frame(frame, date_column)
+    )
@@ -0,0 +1,125 @@
+# utils/channel_rollup.py
+
+import threading
+import time
+from datetime import timedelta
+
+import pandas as pd
+import streamlit as st
+
+from utils.date_index import date_slice
+from utils.db import run_query
+from utils.orders_data import RECHECK_DAYS, REFRESH_INTERVAL, get_orders_dataset
+from utils.result_cache import cached_query
+
+# Same dedup as the page's original CTE (DISTINCT order lines per despatch timestamp), grouped per day
+CHANNEL_DAY_SQL = """
+SELECT CAST(despatch_date AS DATE) AS despatch_day,
+       order_channel AS channel,
+       SUM(order_value) AS total_orders_value,
+       COUNT(DISTINCT order_id) AS orders_count
+FROM (
+    SELECT DISTINCT order_id, order_channel, despatch_date, order_value
+    FROM OrdersDespatch
+    {where}
+) d
+GROUP BY CAST(despatch_date AS DATE), order_channel
+"""
+
+# Distinct orders per channel over a whole range: per-day distinct counts do not add up
+# when an order is despatched on more than one day of the range. Only used for ranges the
+# shared orders dataset does not cover.
+CHANNEL_ORDERS_SQL = """
+SELECT order_channel AS channel, COUNT(DISTINCT order_id) AS orders_count
+FROM OrdersDespatch
+WHERE despatch_date >= ? AND despatch_date < ?
+GROUP BY order_channel
+"""
+
+ROLLUP_COLUMNS = ["despatch_day", "channel", "total_orders_value", "orders_count"]
+
+# The orders dataset window is bounded on order_date, so its first weeks miss lines of
+# orders placed before the window; despatch ranges starting that early go to SQL
+DESPATCH_LAG = timedelta(days=31)
+
+
+class ChannelDayRollup:
+    """Per despatch day × channel order value and order count, kept in memory and topped up.
+
+    The first refresh aggregates the whole table once; later refreshes only re-aggregate
+    the days from ``watermark - recheck_days`` onward (late despatches / edits) and swap
+    them in. Any date range is then a slice-and-sum over a few thousand rows.
+    """
+
+    def __init__(self, recheck_days=RECHECK_DAYS, refresh_interval=REFRESH_INTERVAL):
+        self.recheck_days = recheck_days
+        self.refresh_interval = refresh_interval
+        self._frame = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def frame(self):
+        with self._lock:
+            if self._frame is None or time.monotonic() - self._loaded_at >= self.refresh_interval:
+                self._frame = self._refresh(self._frame)
+                self._loaded_at = time.monotonic()
+            return self._frame
+
+    def invalidate(self):
+        with self._lock:
+            self._frame = None
+
+    def _refresh(self, current):
+        if current is None or current.empty:
+            return self._fetch()
+        cutoff = current["despatch_day"].max() - timedelta(days=self.recheck_days)
+        delta = self._fetch(since=cutoff)
+        kept = current[current["despatch_day"] < cutoff]
+        return pd.concat([kept, delta], ignore_index=True).sort_values("despatch_day", kind="stable", ignore_index=True)
+
+    @staticmethod
+    def _fetch(since=None):
+        if since is None:
+            df = run_query(CHANNEL_DAY_SQL.format(where=""))
+        else:
+            df = run_query(CHANNEL_DAY_SQL.format(where="WHERE despatch_date >= ?"), params=[since.to_pydatetime()])
+        df = df[ROLLUP_COLUMNS] if not df.empty else pd.DataFrame(columns=ROLLUP_COLUMNS)
+        df["despatch_day"] = pd.to_datetime(df["despatch_day"]).dt.normalize()
+        df["total_orders_value"] = pd.to_numeric(df["total_orders_value"]).fillna(0.0).astype("float64")
+        df["orders_count"] = pd.to_numeric(df["orders_count"]).fillna(0).astype("int64")
+        return df.sort_values("despatch_day", kind="stable", ignore_index=True)
+
+    def summary(self, start_date, end_date):
+        """Channel totals for the inclusive despatch range, largest value first (same shape as the old query).
+
+        Values add up exactly across days and come from the rollup. Order counts do not:
+        a single day uses the rollup's count, a longer range counts distinct orders over the
+        whole range from the in-memory orders dataset (or SQL, before its window).
+        """
+        days = date_slice(self.frame(), "despatch_day", start_date, end_date)
+        summary = days.groupby("channel", sort=False, dropna=False)[["total_orders_value", "orders_count"]].sum()
+        if pd.Timestamp(start_date).normalize() != pd.Timestamp(end_date).normalize() and not summary.empty:
+            counts = _range_order_counts(start_date, end_date)
+            summary["orders_count"] = counts.reindex(summary.index).fillna(0).astype("int64")
+        summary = summary.reset_index().sort_values("total_orders_value", ascending=False, ignore_index=True)
+        return summary[["channel", "total_orders_value", "orders_count"]]
+
+
+def _range_order_counts(start_date, end_date):
+    """Distinct orders per channel despatched in the inclusive day range, indexed by channel."""
+    start = pd.Timestamp(start_date).normalize()
+    dataset = get_orders_dataset()
+    if start >= pd.Timestamp(dataset.loader.window_start()) + DESPATCH_LAG:
+        lines = dataset.view(["order_id", "order_channel"], date_column="despatch_date", start=start, end=end_date)
+        counts = lines.groupby("order_channel", sort=False, dropna=False, observed=True)["order_id"].nunique()
+        return counts.set_axis(pd.Index(counts.index.astype(object), name="channel"))
+    stop = pd.Timestamp(end_date).normalize() + timedelta(days=1)
+    df = cached_query(CHANNEL_ORDERS_SQL, params=[start.to_pydatetime(), stop.to_pydatetime()])
+    if df.empty:
+        return pd.Series(dtype="int64")
+    return pd.to_numeric(df["orders_count"]).set_axis(pd.Index(df["channel"], name="channel"))
+
+
+@st.cache_resource(show_spinner=False)
+def get_channel_rollup():
+    return ChannelDayRollup()
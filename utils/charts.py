@@ -0,0 +1,146 @@
+# utils/charts.py
+
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io as pio
+import streamlit as st
+
+from utils.fingerprint import data_fingerprint
+
+# ------------------ CHART SETTINGS ------------------
+WEBGL_THRESHOLD = 1000     # points per trace above which lines are drawn with WebGL (scattergl)
+LINE_MAX_POINTS = 1500     # series longer than this are LTTB-downsampled before plotting
+BOX_POINTS_LIMIT = 2000    # above this, box plots ship precomputed quartiles instead of every point
+MAX_BARS = 60              # bars beyond this are folded into one "Other" bar
+MAX_SLICES = 20            # same for pie / donut slices
+OTHER_LABEL = "Other"
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indices of ``n_out`` points that keep the shape of (x, y)."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    every = (n - 2) / (n_out - 2)
+    keep = np.empty(n_out, dtype="int64")
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        # Keep the point of this bucket forming the largest triangle with the last kept point and the next bucket's mean
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.nanargmax(area)) if np.isfinite(area).any() else start
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(df, x, y, max_points=LINE_MAX_POINTS):
+    if len(df) <= max_points:
+        return df
+    df = df.sort_values(x)
+    xs = df[x]
+    xs = xs.astype("int64") if pd.api.types.is_datetime64_any_dtype(xs) else pd.to_numeric(xs, errors="coerce")
+    return df.iloc[lttb(xs.to_numpy(), df[y].to_numpy(), max_points)]
+
+
+def fold_tail(df, label, value, limit):
+    """Keep the ``limit - 1`` largest rows by ``value`` (original order) and sum the rest into "Other"."""
+    if len(df) <= limit:
+        return df
+    df = df.reset_index(drop=True)
+    top = df.nlargest(limit - 1, value).index
+    rest = df.drop(top)
+    other = {col: None for col in df.columns}
+    other[label] = f"{OTHER_LABEL} ({len(rest):,})"
+    other[value] = rest[value].sum()
+    return pd.concat([df[df.index.isin(top)], pd.DataFrame([other])], ignore_index=True)
+
+
+# ------------------ FIGURE BUILDERS ------------------
+def _line(df, x, y, **kwargs):
+    df = downsample(df, x, y)
+    render_mode = "webgl" if len(df) > WEBGL_THRESHOLD else "svg"
+    return px.line(df, x=x, y=y, render_mode=render_mode, **kwargs)
+
+
+def _bar(df, x, y, text=None, max_bars=MAX_BARS, **kwargs):
+    df = fold_tail(df, x, y, max_bars)
+    return px.bar(df, x=x, y=y, text=text, **kwargs)
+
+
+def _pie(df, names, values, max_slices=MAX_SLICES, **kwargs):
+    return px.pie(fold_tail(df, names, values, max_slices), names=names, values=values, **kwargs)
+
+
+def _box(df, x, y, title=None, category_orders=None, points="all", color=None):
+    if len(df) <= BOX_POINTS_LIMIT:
+        return px.box(df, x=x, y=y, points=points, color=color, title=title, category_orders=category_orders)
+
+    # Too many points to ship: send five-number summaries computed here, one box per category
+    order = (category_orders or {}).get(x) or sorted(df[x].dropna().unique().tolist())
+    groups = df.groupby(x, observed=True)[y]
+    stats = groups.quantile([0.25, 0.5, 0.75]).unstack()
+    palette = px.colors.qualitative.Plotly
+    fig = go.Figure()
+    for i, category in enumerate(c for c in order if c in stats.index):
+        q1, median, q3 = stats.loc[category, [0.25, 0.5, 0.75]]
+        values = groups.get_group(category)
+        iqr = q3 - q1
+        lower = values[values >= q1 - 1.5 * iqr].min()
+        upper = values[values <= q3 + 1.5 * iqr].max()
+        fig.add_trace(go.Box(
+            name=str(category), x=[category], q1=[q1], median=[median], q3=[q3],
+            lowerfence=[lower], upperfence=[upper], mean=[values.mean()],
+            marker_color=palette[i % len(palette)] if color else None,
+        ))
+    fig.update_layout(title=title, xaxis_title=x, yaxis_title=y, showlegend=bool(color))
+    return fig
+
+
+_BUILDERS = {"line": _line, "bar": _bar, "pie": _pie, "box": _box}
+
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def _figure_json(kind, fingerprint, spec_json, _data):
+    # _data is not hashed by st.cache_data → the content fingerprint is the key
+    spec = json.loads(spec_json)
+    layout, traces = spec.pop("layout", None), spec.pop("traces", None)
+    fig = _BUILDERS[kind](_data, **spec)
+    if traces:
+        fig.update_traces(**traces)
+    if layout:
+        fig.update_layout(**layout)
+    return fig.to_json()
+
+
+def _figure(kind, data, **spec):
+    spec_json = json.dumps(spec, sort_keys=True, default=str)
+    return pio.from_json(_figure_json(kind, data_fingerprint(data), spec_json, data), skip_invalid=True)
+
+
+# ------------------ PUBLIC HELPERS ------------------
+def line_chart(df, x, y, **spec):
+    return _figure("line", df[[x, y]], x=x, y=y, **spec)
+
+
+def bar_chart(df, x, y, text=None, **spec):
+    columns = list(dict.fromkeys([x, y] + ([text] if text else [])))
+    return _figure("bar", df[columns], x=x, y=y, text=text, **spec)
+
+
+def pie_chart(df, names, values, color=None, **spec):
+    columns = list(dict.fromkeys([names, values] + ([color] if color else [])))
+    return _figure("pie", df[columns], names=names, values=values, color=color, **spec)
+
+
+def box_chart(df, x, y, color=None, **spec):
+    columns = list(dict.fromkeys([x, y] + ([color] if color else [])))
+    return _figure("box", df[columns], x=x, y=y, color=color, **spec)
@@ -0,0 +1,96 @@
+# utils/compact_schema.py
+
+import pandas as pd
+
+# ------------------ ORDER FRAME SCHEMA ------------------
+# Strings repeated on every order line → category; counts → int32.
+# Money columns stay float64: float32 only carries ~7 significant digits, which is
+# not enough for 12-month revenue totals shown to the penny.
+ORDERS_SCHEMA = {
+    "order_channel": "category",
+    "product_sku": "category",
+    "product_name": "category",
+    "product_category": "category",
+    "customer_name": "category",
+    "order_courier_service": "category",
+    "order_cust_postcode": "category",
+    "product_qty": "int32",
+    "order_value": "float64",
+    "product_price": "float64",
+    "cost_price": "float64",
+    "order_date": "date",
+    "despatch_date": "date",
+}
+
+
+def _column_bytes(series):
+    return int(series.memory_usage(index=False, deep=True))
+
+
+def _compact_column(series, kind):
+    if kind == "category":
+        return series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category")
+    if kind == "date":
+        return pd.to_datetime(series).dt.normalize()
+    if kind in ("int32", "int16", "int8"):
+        numeric = pd.to_numeric(series, errors="coerce")
+        if numeric.isna().any():
+            return numeric.astype("float32")  # small whole numbers are exact in float32
+        return numeric.astype(kind)
+    return pd.to_numeric(series, errors="coerce").astype(kind)
+
+
+def apply_schema(df, schema=ORDERS_SCHEMA, report=False):
+    """Cast the columns of ``df`` named in ``schema``; other columns are left alone.
+
+    With ``report=True`` also returns a per-column table of bytes before/after.
+    """
+    rows = []
+    out = df.copy(deep=False)
+    for col, kind in schema.items():
+        if col not in out.columns:
+            continue
+        before = _column_bytes(out[col]) if report else 0
+        out[col] = _compact_column(out[col], kind)
+        if report:
+            rows.append({
+                "column": col,
+                "dtype": str(out[col].dtype),
+                "bytes_before": before,
+                "bytes_after": _column_bytes(out[col]),
+            })
+    if not report:
+        return out
+
+    report_df = pd.DataFrame(rows, columns=["column", "dtype", "bytes_before", "bytes_after"])
+    report_df["bytes_saved"] = report_df["bytes_before"] - report_df["bytes_after"]
+    return out, report_df.sort_values("bytes_saved", ascending=False).reset_index(drop=True)
+
+
+def concat_compact(frames):
+    """pd.concat that keeps categorical columns categorical (plain concat falls back to object)."""
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return pd.DataFrame()
+    for col, dtype in frames[0].dtypes.items():
+        if not isinstance(dtype, pd.CategoricalDtype):
+            continue
+        categories = frames[0][col].cat.categories
+        for f in frames[1:]:
+            if isinstance(f[col].dtype, pd.CategoricalDtype):
+                categories = categories.union(f[col].cat.categories)
+            else:
+                categories = categories.union(pd.Index(f[col].dropna().unique()))
+        frames = [f.assign(**{col: pd.Categorical(f[col], categories=categories)}) for f in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_summary(report_df):
+    total_before = int(report_df["bytes_before"].sum())
+    total_after = int(report_df["bytes_after"].sum())
+    return {
+        "bytes_before": total_before,
+        "bytes_after": total_after,
+        "bytes_saved": total_before - total_after,
+        "ratio": total_before / total_after if total_after else 0,
+    }
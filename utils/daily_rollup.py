@@ -0,0 +1,67 @@
+# utils/daily_rollup.py
+
+import numpy as np
+import pandas as pd
+
+ROLLUP_MEASURES = ["orders", "revenue", "qty"]
+
+
+class DailyRollup:
+    """Per-day order totals with running sums, so any [start, end] window costs O(1).
+
+    Days are dense (one slot per calendar day between the first and last order date),
+    which turns a date into an array offset without a lookup. Distinct SKUs are not
+    additive; see utils.sku_bitmaps for those.
+    """
+
+    def __init__(self, days, totals):
+        self.days = days
+        # cum[m][i] = total of measure m over days[:i]; the leading 0 makes a window cum[j] - cum[i]
+        self._cum = {m: np.concatenate([[0.0], np.cumsum(totals[m])]) for m in ROLLUP_MEASURES}
+
+    @classmethod
+    def from_frame(cls, df, date_column="order_date"):
+        lines = df[[date_column, "order_id", "order_value", "product_qty"]]
+        lines = lines[lines[date_column].notna()]
+        if lines.empty:
+            return cls(pd.DatetimeIndex([]), {m: np.zeros(0) for m in ROLLUP_MEASURES})
+
+        # Dedup rule: an order counts once per day, at its highest line order_value
+        orders = lines.groupby([date_column, "order_id"], observed=True, sort=False)["order_value"].max()
+        by_day = orders.groupby(level=0)
+        per_day = pd.DataFrame({
+            "orders": by_day.size(),
+            "revenue": by_day.sum(),
+            "qty": lines.groupby(date_column)["product_qty"].sum(),
+        })
+        days = pd.date_range(per_day.index.min(), per_day.index.max(), freq="D")
+        per_day = per_day.reindex(days, fill_value=0)
+        return cls(days, {m: per_day[m].to_numpy(dtype="float64") for m in ROLLUP_MEASURES})
+
+    @property
+    def first_day(self):
+        return self.days[0] if len(self.days) else None
+
+    @property
+    def last_day(self):
+        return self.days[-1] if len(self.days) else None
+
+    def covers(self, start):
+        return self.first_day is not None and pd.Timestamp(start) >= self.first_day
+
+    def _slots(self, start, end):
+        n = len(self.days)
+        i = (pd.Timestamp(start).normalize() - self.days[0]).days
+        j = (pd.Timestamp(end).normalize() - self.days[0]).days + 1
+        i, j = min(max(i, 0), n), min(max(j, 0), n)
+        return i, max(i, j)
+
+    def window(self, start, end):
+        """Totals for the inclusive day range [start, end]: orders, revenue, qty, aov."""
+        if not len(self.days):
+            totals = {m: 0.0 for m in ROLLUP_MEASURES}
+        else:
+            i, j = self._slots(start, end)
+            totals = {m: float(cum[j] - cum[i]) for m, cum in self._cum.items()}
+        totals["aov"] = totals["revenue"] / totals["orders"] if totals["orders"] else 0.0
+        return totals
@@ -0,0 +1,74 @@
+# utils/date_index.py
+
+import numpy as np
+import pandas as pd
+
+EPOCH = pd.Timestamp("1970-01-01")
+_NAT_DAY = np.iinfo("int32").max  # NaT sorts after every real day
+
+
+def day_number(value):
+    return (pd.Timestamp(value).normalize() - EPOCH).days
+
+
+def day_numbers(dates):
+    """Days since 1970-01-01 as int32; NaT → a sentinel that sorts last."""
+    values = dates.to_numpy(dtype="datetime64[D]")
+    return np.where(np.isnat(values), _NAT_DAY, values.astype("int64")).astype("int32")
+
+
+def _bounds(days, start, end, nat):
+    i = 0 if start is None else int(np.searchsorted(days, day_number(start), "left"))
+    j = int(np.searchsorted(days, nat if end is None else day_number(end) + 1, "left"))
+    return i, max(i, j)
+
+
+class DateIndex:
+    """``frame`` ordered by one date column, so a date range is a binary search instead of a mask scan.
+
+    A frame that is already sorted on the column is sliced in place (``iloc`` → no copy);
+    otherwise a stable argsort is kept and a range only gathers its own rows.
+    """
+
+    def __init__(self, frame, date_column):
+        days = day_numbers(frame[date_column])
+        self._order = None
+        if len(days) and np.any(days[1:] < days[:-1]):
+            self._order = np.argsort(days, kind="stable")
+            days = days[self._order]
+        self.frame = frame
+        self.date_column = date_column
+        self.days = days
+
+    def slice(self, start=None, end=None):
+        """Rows with start <= date <= end (whole days; either bound may be None), in date order."""
+        i, j = _bounds(self.days, start, end, _NAT_DAY)
+        if self._order is None:
+            return self.frame.iloc[i:j]
+        return self.frame.take(self._order[i:j])
+
+
+def date_slice(df, date_column, start=None, end=None):
+    """``df`` rows with start <= date <= end, for a frame already sorted by ``date_column``.
+
+    Frames handed out by the shared orders dataset (and any row subset of them) keep
+    that order, so this replaces ``df[df[col].between(start, end)]`` with two binary searches.
+    """
+    values = df[date_column].to_numpy()
+    unit = np.datetime_data(values.dtype)[0]
+
+    def day_start(day):
+        return np.datetime64(int(day), "D").astype(values.dtype)
+
+    i = 0 if start is None else int(np.searchsorted(values, day_start(day_number(start))))
+    j = int(np.searchsorted(values, np.datetime64("NaT", unit) if end is None else day_start(day_number(end) + 1)))
+    return df.iloc[i:max(i, j)]
+
+
+def window_sums(df, date_column, value_column, starts, ends):
+    """Sum of ``value_column`` over each inclusive [starts[k], ends[k]] window of a date-sorted ``df``."""
+    days = day_numbers(df[date_column])
+    cum = np.concatenate([[0.0], np.cumsum(np.nan_to_num(df[value_column].to_numpy(dtype="float64")))])
+    lo = np.searchsorted(days, np.asarray([day_number(d) for d in starts]), "left")
+    hi = np.searchsorted(days, np.asarray([day_number(d) + 1 for d in ends]), "left")
+    return cum[hi] - cum[np.minimum(lo, hi)]
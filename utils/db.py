@@ -1,29 +1,279 @@
+import datetime
+import decimal
+import random
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+import pyarrow as pa
 import pyodbc
 
+# ------------------ CONNECTION SETTINGS ------------------
+DEFAULT_SERVER = "mptcecommerce-sql-server.database.windows.net"
+DEFAULT_DATABASE = "mptcecommerce-db"
+DEFAULT_USERNAME = "mptcadmin"
+DEFAULT_PASSWORD = "Mptc@2025"
+
+# ------------------ POOL SETTINGS ------------------
+POOL_MAX_SIZE = 8            # max connections open per process (idle + in use)
+POOL_IDLE_TIMEOUT = 300      # seconds an idle connection is kept before eviction
+POOL_HEALTHCHECK_AFTER = 30  # idle seconds after which a connection is pinged on checkout
+POOL_ACQUIRE_TIMEOUT = 120   # seconds to wait for a free slot when the pool is full
+CONNECT_RETRIES = 3
+CONNECT_BACKOFF = 0.5        # base seconds, doubled per attempt (+ jitter)
+
+# ------------------ FETCH SETTINGS ------------------
+FETCH_BATCH_SIZE = 20000     # rows pulled per fetchmany() → bounds the Python objects alive at once
+
+
+def build_connection_string(server, database, username, password, timeout=60):
+    return (
+        f"Driver={{ODBC Driver 17 for SQL Server}};"
+        f"Server={server};"
+        f"Database={database};"
+        f"Uid={username};"
+        f"Pwd={password};"
+        f"Encrypt=yes;"
+        f"TrustServerCertificate=no;"
+        f"Connection Timeout={timeout};"
+    )
+
+
+class PooledConnection:
+    """Thin proxy around a pyodbc connection; close() hands it back to the pool."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise pyodbc.ProgrammingError("Attempt to use a closed connection.")
+        return getattr(self._raw, name)
+
+    def close(self, discard=False):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.release(raw, discard=discard)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # A failed statement may leave the session in a bad state → don't reuse it
+        self.close(discard=exc_type is not None and issubclass(exc_type, pyodbc.Error))
+        return False
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Process-wide pool of warm pyodbc connections with health checks and idle eviction."""
+
+    def __init__(self, connection_string, max_size=POOL_MAX_SIZE, idle_timeout=POOL_IDLE_TIMEOUT,
+                 healthcheck_after=POOL_HEALTHCHECK_AFTER, retries=CONNECT_RETRIES, backoff=CONNECT_BACKOFF):
+        self.connection_string = connection_string
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.healthcheck_after = healthcheck_after
+        self.retries = retries
+        self.backoff = backoff
+        self._idle = deque()  # (raw_connection, last_used) — most recently used on the right
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    # ---- public API ----
+    def acquire(self, timeout=POOL_ACQUIRE_TIMEOUT):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No database connection available after {timeout}s (pool size {self.max_size}).")
+        try:
+            self._evict_idle()
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    return PooledConnection(self, self._connect())
+                raw, last_used = entry
+                if time.monotonic() - last_used < self.healthcheck_after or self._is_healthy(raw):
+                    return PooledConnection(self, raw)
+                self._close_quietly(raw)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, raw, discard=False):
+        try:
+            if not discard:
+                try:
+                    raw.rollback()  # end any open read transaction before reuse
+                except pyodbc.Error:
+                    discard = True
+            if discard:
+                self._close_quietly(raw)
+            else:
+                with self._lock:
+                    self._idle.append((raw, time.monotonic()))
+        finally:
+            self._slots.release()
+        self._evict_idle()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for raw, _ in idle:
+            self._close_quietly(raw)
+
+    # ---- internals ----
+    def _connect(self):
+        for attempt in range(self.retries):
+            try:
+                return pyodbc.connect(self.connection_string)
+            except pyodbc.Error:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(self.backoff * (2 ** attempt) + random.uniform(0, self.backoff))
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = []
+        with self._lock:
+            while self._idle and self._idle[0][1] < cutoff:
+                expired.append(self._idle.popleft()[0])
+        for raw in expired:
+            self._close_quietly(raw)
+
+    @staticmethod
+    def _is_healthy(raw):
+        try:
+            cursor = raw.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except pyodbc.Error:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(connection_string=None):
+    connection_string = connection_string or build_connection_string(
+        DEFAULT_SERVER, DEFAULT_DATABASE, DEFAULT_USERNAME, DEFAULT_PASSWORD
+    )
+    with _pools_lock:
+        if connection_string not in _pools:
+            _pools[connection_string] = ConnectionPool(connection_string)
+        return _pools[connection_string]
+
+
 def connect_db(server=None, database=None, username=None, password=None):
     if server and database and username and password:
-        # Home.py will pass arguments → use them
-        connection_string = (
-            f"Driver={{ODBC Driver 17 for SQL Server}};"
-            f"Server={server};"
-            f"Database={database};"
-            f"Uid={username};"
-            f"Pwd={password};"
-            f"Encrypt=yes;"
-            f"TrustServerCertificate=no;"
-            f"Connection Timeout=60;"
-        )
-    else:
-        # Default for other pages
-        connection_string = (
-            "Driver={ODBC Driver 17 for SQL Server};"
-            "Server=mptcecommerce-sql-server.database.windows.net;"
-            "Database=mptcecommerce-db;"
-            "Uid=mptcadmin;"
-            "Pwd=Mptc@2025;"
-            "Encrypt=yes;"
-            "TrustServerCertificate=no;"
-            "Connection Timeout=60;"
-        )
-
-    return pyodbc.connect(connection_string)
+        # Home.py passes arguments to test credentials → fresh, unpooled connection
+        return pyodbc.connect(build_connection_string(server, database, username, password))
+
+    # Default for all pages: borrow a warm connection; conn.close() returns it to the pool
+    return get_pool().acquire()
+
+
+# ------------------ STREAMING FETCH ------------------
+# pyodbc reports the Python type of each column in cursor.description
+_ARROW_TYPES = {
+    str: pa.string(),
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+    decimal.Decimal: pa.float64(),
+    datetime.datetime: pa.timestamp("us"),
+    datetime.date: pa.date32(),
+    bytes: pa.binary(),
+    bytearray: pa.binary(),
+}
+
+
+def _to_arrow(values, python_type):
+    arrow_type = _ARROW_TYPES.get(python_type)
+    if python_type is decimal.Decimal:
+        values = [None if v is None else float(v) for v in values]
+    if arrow_type is None:
+        try:
+            return pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return pa.array([None if v is None else str(v) for v in values], type=pa.string())
+    array = pa.array(values, type=arrow_type)
+    if python_type is datetime.date:
+        array = array.cast(pa.timestamp("us"))  # dates behave like the datetime columns downstream
+    return array
+
+
+def fetch_frame(conn, query, params=None, batch_size=FETCH_BATCH_SIZE):
+    """Run ``query`` and stream the result into a DataFrame via Arrow record batches.
+
+    Unlike ``pd.read_sql`` this never holds the whole result as pyodbc Rows: each
+    ``fetchmany`` batch is decoded column-wise into typed Arrow buffers and dropped.
+    DECIMAL/MONEY columns come back as float64 and DATE columns as datetime64.
+    """
+    cursor = conn.cursor()
+    try:
+        if params:
+            cursor.execute(query, list(params))
+        else:
+            cursor.execute(query)
+        names = [d[0] for d in cursor.description]
+        types = [d[1] for d in cursor.description]
+
+        batches = []
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            del rows
+            arrays = [_to_arrow(values, python_type) for values, python_type in zip(columns, types)]
+            del columns
+            batches.append(pa.RecordBatch.from_arrays(arrays, names=names))
+    finally:
+        cursor.close()
+
+    if not batches:
+        schema = pa.schema([(name, _ARROW_TYPES.get(t, pa.null())) for name, t in zip(names, types)])
+        return schema.empty_table().to_pandas()
+
+    table = pa.Table.from_batches(batches)
+    del batches
+    # self_destruct releases each Arrow column as soon as it is converted → flat peak memory
+    return table.to_pandas(self_destruct=True, split_blocks=True, coerce_temporal_nanoseconds=True)
+
+
+# ------------------ PARAMETERISED QUERIES ------------------
+def day_range(start_date, end_date):
+    """Inclusive [start_date, end_date] days → half-open (start, end + 1 day) datetimes.
+
+    Used as ``col >= ? AND col < ?`` so the predicate stays sargable (no CAST on the column).
+    """
+    start = pd.Timestamp(start_date).normalize().to_pydatetime()
+    end = (pd.Timestamp(end_date).normalize() + pd.Timedelta(days=1)).to_pydatetime()
+    return start, end
+
+
+def run_query(query, params=None):
+    """Execute a ``?``-parameterised statement on a pooled connection and return a DataFrame.
+
+    Values are always bound, never formatted into the SQL text, so the statement text is
+    identical for every call and SQL Server reuses one cached plan.
+    """
+    with connect_db() as conn:
+        return fetch_frame(conn, query, params=params)
@@ -0,0 +1,172 @@
+# utils/exports.py
+
+import gzip
+import io
+import re
+import tempfile
+from itertools import islice
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import xlsxwriter
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+SPOOL_MAX_BYTES = 16 * 1024 * 1024  # exports up to this size stay in memory, larger ones spill to disk
+EXPORT_CHUNK_ROWS = 100_000         # rows serialised at a time by the CSV / Parquet writers
+EXCEL_MAX_ROWS = 1_048_576          # rows per worksheet; longer frames continue on "<name> (2)", ...
+SHEET_NAME_MAX = 31
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+# Reusable cell formats, created once per workbook (xlsxwriter stores each distinct format once)
+FORMATS = {
+    "bold": {"bold": True},
+    "header": {"bold": True, "align": "center", "border": 1, "bg_color": "#F2F2F2"},
+    "cell": {"align": "center", "border": 1},
+    "money": {"num_format": "£#,##0.00", "align": "center", "border": 1},
+    "int": {"num_format": "#,##0", "align": "center", "border": 1},
+    "date": {"num_format": "yyyy-mm-dd", "align": "center", "border": 1},
+}
+# Bold "<key>_total" variant of every format for total rows, keeping its number / date format
+FORMATS.update({f"{key}_total": {**props, "bold": True} for key, props in list(FORMATS.items())})
+FORMATS["total"] = FORMATS["cell_total"]
+
+
+class Sheet:
+    """One worksheet of an export: a frame plus how to lay it out.
+
+    ``preamble`` is a list of (label, value) rows written above the table (label in bold);
+    ``formats`` maps column → a FORMATS key ("money", "int", ...), other columns use "date"
+    (datetime columns) or "cell";
+    ``total_rows`` is an optional boolean per-row sequence of rows written in bold.
+    """
+
+    def __init__(self, name, frame, preamble=(), formats=None, total_rows=None, widths=None, index=False):
+        self.name = name
+        self.frame = frame.reset_index() if index else frame
+        self.preamble = list(preamble)
+        self.formats = formats or {}
+        self.total_rows = total_rows
+        self.widths = widths or {}
+
+
+def _column_values(series):
+    """Python scalars for one column (numpy types / NaN / NaT → int, float, datetime, None)."""
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _sheet_names(names):
+    """Excel-safe, unique sheet names (31 chars, no []:*?/\\), in order."""
+    used = set()
+    for name in names:
+        base = _INVALID_SHEET_CHARS.sub("_", str(name))[:SHEET_NAME_MAX] or "Sheet"
+        candidate, n = base, 2
+        while candidate.lower() in used:
+            suffix = f" ({n})"
+            candidate, n = base[:SHEET_NAME_MAX - len(suffix)] + suffix, n + 1
+        used.add(candidate.lower())
+        yield candidate
+
+
+def _first_body_row(sheet):
+    # preamble rows, one blank spacer row if there is a preamble, then the header
+    return len(sheet.preamble) + (2 if sheet.preamble else 1)
+
+
+def _sheet_count(sheet):
+    return max(1, -(-len(sheet.frame) // (EXCEL_MAX_ROWS - _first_body_row(sheet))))
+
+
+def _write_sheet(workbook, formats, names, sheet):
+    df = sheet.frame
+    columns = [_column_values(df[col]) for col in df.columns]  # one conversion pass per column
+    keys = [sheet.formats.get(col, "date" if df[col].dtype.kind == "M" else "cell") for col in df.columns]
+    cell_formats = [formats[key] for key in keys]
+    total_formats = [formats[f"{key}_total"] for key in keys]
+    totals = sheet.total_rows if sheet.total_rows is not None else [False] * len(df)
+    rows = zip(totals, *columns)
+    first_body_row = _first_body_row(sheet)
+
+    for _ in range(_sheet_count(sheet)):
+        ws = workbook.add_worksheet(next(names))
+        # constant_memory: rows must be written top to bottom, each row is flushed once complete
+        for r, (label, value) in enumerate(sheet.preamble):
+            ws.write(r, 0, label, formats["bold"])
+            ws.write(r, 1, value)
+        for c, col in enumerate(df.columns):
+            ws.write(first_body_row - 1, c, str(col), formats["header"])
+            ws.set_column(c, c, sheet.widths.get(col, max(12, min(40, len(str(col)) + 4))))
+        for r, (is_total, *values) in enumerate(islice(rows, EXCEL_MAX_ROWS - first_body_row), first_body_row):
+            row_formats = total_formats if is_total else cell_formats
+            for c, value in enumerate(values):
+                ws.write(r, c, value, row_formats[c])
+
+
+def excel_bytes(sheets):
+    """Workbook bytes for ``sheets`` (list of Sheet), streamed with xlsxwriter's constant-memory mode.
+
+    Rows go straight to the worksheet files and the zip is written into a spooled temp
+    file, so peak memory is roughly one row plus the finished file, not a cell object graph.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+        # ±inf (e.g. a ratio over zero) is written as an Excel error cell instead of raising
+        workbook = xlsxwriter.Workbook(spool, {"constant_memory": True, "nan_inf_to_errors": True})
+        formats = {key: workbook.add_format(props) for key, props in FORMATS.items()}
+        names = _sheet_names(s.name for s in sheets for _ in range(_sheet_count(s)))
+        for sheet in sheets:
+            _write_sheet(workbook, formats, names, sheet)
+        workbook.close()
+        spool.seek(0)
+        return spool.read()
+
+
+def frame_to_excel(df, sheet_name="Sheet1", **sheet_kwargs):
+    return excel_bytes([Sheet(sheet_name, df, **sheet_kwargs)])
+
+
+def csv_bytes(df):
+    return df.to_csv(index=False).encode("utf-8")
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def csv_gzip_bytes(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """gzip-compressed CSV, written ``chunk_rows`` at a time into a spooled temp file."""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+        with gzip.GzipFile(fileobj=spool, mode="wb", compresslevel=6, mtime=0) as gz:
+            with io.TextIOWrapper(gz, encoding="utf-8", newline="") as text:
+                df.iloc[:0].to_csv(text, index=False)  # header row
+                for chunk in _chunks(df, chunk_rows):
+                    chunk.to_csv(text, index=False, header=False)
+        spool.seek(0)
+        return spool.read()
+
+
+def _parquet_schema(sample):
+    """Arrow schema inferred from real rows; columns that are all-null there (object / None) become strings."""
+    schema = pa.Table.from_pandas(sample, preserve_index=False).schema
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    return schema
+
+
+def parquet_bytes(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """zstd Parquet with one row group per ``chunk_rows`` rows, written into a spooled temp file."""
+    schema = _parquet_schema(df.iloc[:chunk_rows])
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as spool:
+        with pq.ParquetWriter(spool, schema, compression="zstd") as writer:
+            for chunk in _chunks(df, chunk_rows):
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        spool.seek(0)
+        return spool.read()
+
+
+# Download formats for raw-data exports: label → (builder, file extension, mime)
+DATA_EXPORT_FORMATS = {
+    "CSV (gzip)": (csv_gzip_bytes, ".csv.gz", "application/gzip"),
+    "Parquet": (parquet_bytes, ".parquet", "application/vnd.apache.parquet"),
+    "CSV": (csv_bytes, ".csv", "text/csv"),
+}
@@ -0,0 +1,85 @@
+# utils/facet_index.py
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.fingerprint import data_fingerprint
+
+
+class FacetIndex:
+    """Value → row bitmap index over the facet columns of a small, slowly changing table.
+
+    Per column it keeps the sorted distinct values, a code per row and the rows of each
+    value as one contiguous posting list, so a selection becomes a packed row bitmap
+    without scanning the column. Facet counts are disjunctive: the options of a column
+    are counted over the rows matching every *other* column's selection.
+    """
+
+    def __init__(self, df, columns):
+        self.n_rows = len(df)
+        self.columns = list(columns)
+        self._values = {}    # column → Index of sorted distinct values (NaN excluded)
+        self._codes = {}     # column → int32 code per row (-1: NaN)
+        self._postings = {}  # column → (row positions ordered by code, offsets into them per code)
+        for col in self.columns:
+            codes, values = pd.factorize(df[col], sort=True)
+            order = np.argsort(codes, kind="stable")
+            offsets = np.searchsorted(codes[order], np.arange(len(values) + 1))
+            self._values[col] = values
+            self._codes[col] = codes.astype("int32")
+            self._postings[col] = (order, offsets)
+
+    def rows_bitmap(self, positions):
+        """Packed bitmap of the row ``positions``."""
+        bits = np.zeros(self.n_rows, dtype=bool)
+        bits[positions] = True
+        return np.packbits(bits)
+
+    def _rows(self, bitmap):
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.n_rows))
+
+    def values(self, column):
+        return list(self._values[column])
+
+    def value_bitmap(self, column, values):
+        """Rows holding any of ``values`` in ``column`` (unknown values match nothing)."""
+        order, offsets = self._postings[column]
+        codes = self._values[column].get_indexer(list(values))
+        codes = codes[codes >= 0]
+        if not len(codes):
+            return self.rows_bitmap([])
+        return self.rows_bitmap(np.concatenate([order[offsets[c]:offsets[c + 1]] for c in codes]))
+
+    def selection_bitmap(self, selections, base=None, exclude=None):
+        """AND of the non-empty ``selections`` ({column: values}) and ``base``; None → no constraint."""
+        bitmap = base
+        for column, values in selections.items():
+            if not values or column == exclude:
+                continue
+            bits = self.value_bitmap(column, values)
+            bitmap = bits if bitmap is None else bitmap & bits
+        return bitmap
+
+    def facet_counts(self, column, selections, base=None):
+        """Rows per value of ``column`` among rows matching the other columns' selections (zero counts dropped)."""
+        bitmap = self.selection_bitmap(selections, base=base, exclude=column)
+        codes = self._codes[column] if bitmap is None else self._codes[column][self._rows(bitmap)]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self._values[column]))
+        present = np.flatnonzero(counts)
+        return pd.Series(counts[present], index=self._values[column][present])
+
+    def matching_rows(self, selections, base=None):
+        """Row positions matching every selection (all rows when nothing is selected)."""
+        bitmap = self.selection_bitmap(selections, base=base)
+        return np.arange(self.n_rows) if bitmap is None else self._rows(bitmap)
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _facet_index(fingerprint, columns, _df):
+    return FacetIndex(_df, columns)
+
+
+def get_facet_index(df, columns):
+    """FacetIndex for ``df``, built once per catalog version (content fingerprint) and shared."""
+    return _facet_index(data_fingerprint(df[list(columns)]), tuple(columns), df)
@@ -0,0 +1,12 @@
+# utils/fingerprint.py
+
+import hashlib
+
+import pandas as pd
+
+
+def data_fingerprint(df):
+    """Content hash of a frame (values, columns and dtypes), used as a cache key for derived results."""
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest.update(repr(list(zip(df.columns, map(str, df.dtypes)))).encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,101 @@
+# utils/html_tables.py
+
+import html
+
+import numpy as np
+import streamlit as st
+
+PAGE_SIZE = 200  # rows per rendered page; the rest stay server-side
+
+# One stylesheet for every HTML table on a page (emit once with table_css())
+TABLE_CSS = """
+<style>
+.mptc-table { border-collapse: collapse; width: 100%; }
+.mptc-table th, .mptc-table td { border: 1px solid #ccc; padding: 6px 10px; text-align: center; }
+.mptc-table th { background-color: #f2f2f2; font-weight: 600; }
+.mptc-table td.highlight { background-color: #c9daf8; font-weight: bold; }
+.mptc-table tr.total td { font-weight: bold; background-color: #f9f9f9; }
+.mptc-scroll { overflow-x: auto; padding-bottom: 10px; }
+.mptc-matrix { border-collapse: collapse; font-size: 14px; margin-bottom: 30px; min-width: 900px; }
+.mptc-matrix th, .mptc-matrix td { border: 1px solid #999; padding: 6px 10px; text-align: center; }
+.mptc-matrix th { background-color: #f2f2f2; }
+.mptc-matrix tr.header-row th { background-color: #d9ead3; font-weight: bold; }
+</style>
+"""
+
+
+def table_css():
+    st.markdown(TABLE_CSS, unsafe_allow_html=True)
+
+
+def _default_format(values):
+    if values.dtype.kind == "f":
+        return ["" if np.isnan(v) else f"{v:.1f}" for v in values]
+    return [str(v) for v in values]
+
+
+def format_column(series, fmt=None, escape=True):
+    """Whole column → list of cell strings; ``fmt`` is a format string ("£ {:,.2f}") or a callable."""
+    values = series.to_numpy()
+    if fmt is None:
+        cells = _default_format(values)
+    elif callable(fmt):
+        cells = [fmt(v) for v in values]
+    else:
+        cells = [fmt.format(v) for v in values]
+    return [html.escape(c) for c in cells] if escape else cells
+
+
+def render_table(df, formats=None, highlight_cols=(), raw_cols=(), row_classes=None, header=None,
+                 labels=None, font_size=14, table_class="mptc-table"):
+    """HTML for ``df`` built column-wise: one formatting pass per column, one join per row.
+
+    ``raw_cols`` hold pre-built HTML and are not escaped; ``row_classes`` is an optional
+    per-row class (e.g. "total"); ``header`` replaces the generated <thead> contents.
+    """
+    formats = formats or {}
+    labels = labels or {}
+    highlight = set(highlight_cols)
+    columns = []
+    for col in df.columns:
+        open_tag = "<td class='highlight'>" if col in highlight else "<td>"
+        cells = format_column(df[col], formats.get(col), escape=col not in raw_cols)
+        columns.append([f"{open_tag}{cell}</td>" for cell in cells])
+
+    if row_classes is None:
+        row_open = ["<tr>"] * len(df)
+    else:
+        row_open = [f"<tr class='{cls}'>" if cls else "<tr>" for cls in row_classes]
+    body = "".join(start + "".join(cells) + "</tr>" for start, *cells in zip(row_open, *columns))
+
+    if header is None:
+        header = "<tr>" + "".join(f"<th>{html.escape(str(labels.get(c, c)))}</th>" for c in df.columns) + "</tr>"
+    return (
+        f"<table class='{table_class}' style='font-size: {font_size}px;'>"
+        f"<thead>{header}</thead><tbody>{body}</tbody></table>"
+    )
+
+
+def paginate(total, key, page_size=PAGE_SIZE, label="rows"):
+    """Page picker for ``total`` items; returns the (start, stop) slice of the selected page."""
+    if total <= page_size:
+        return 0, total
+    pages = -(-total // page_size)
+    if st.session_state.get(key, 1) > pages:  # fewer pages than on the last run (filters changed)
+        st.session_state[key] = pages
+    # A default alongside a Session State value makes Streamlit warn → only pass it on first render
+    default = {} if key in st.session_state else {"value": 1}
+    page = st.number_input(f"Page (1–{pages})", min_value=1, max_value=pages, step=1, key=key, **default)
+    start = (int(page) - 1) * page_size
+    stop = min(start + page_size, total)
+    st.caption(f"Showing {label} {start + 1:,}–{stop:,} of {total:,}")
+    return start, stop
+
+
+def paginated_table(df, key, page_size=PAGE_SIZE, **render_kwargs):
+    """Render one page of ``df`` as an HTML table; only that page is formatted and sent."""
+    start, stop = paginate(len(df), key, page_size)
+    page = df.iloc[start:stop]
+    if render_kwargs.get("row_classes") is not None:
+        render_kwargs["row_classes"] = list(render_kwargs["row_classes"])[start:stop]
+    st.markdown(render_table(page, **render_kwargs), unsafe_allow_html=True)
@@ -0,0 +1,135 @@
+# utils/kpi_queries.py
+
+from datetime import timedelta
+
+import pandas as pd
+import streamlit as st
+
+from utils.result_cache import cached_query
+
+# ------------------ KPI PERIODS ------------------
+# label → (days in window, days the T-1 window ends before the latest order date)
+KPI_PERIODS = {
+    "Yesterday": (1, 1),
+    "Last 7 Days": (7, 0),
+    "Last 1 Month": (30, 0),
+    "Last 3 Months": (90, 0),
+    "Last 6 Months": (180, 0),
+    "Last 1 Year": (365, 0),
+}
+KPI_COLUMNS = ["orders", "revenue", "aov", "skus"]
+
+
+def custom_period(start, end, today):
+    """(days, shift) of an explicit [start, end] range, in the same terms as KPI_PERIODS."""
+    start, end, today = (pd.Timestamp(d).normalize() for d in (start, end, today))
+    return (end - start).days + 1, (today - end).days
+
+
+def kpi_windows(today, periods=KPI_PERIODS):
+    """(label, slot, start, end) for every T-1 / T-2 window, ends inclusive."""
+    windows = []
+    for label, (days, shift) in periods.items():
+        t1_end = today - timedelta(days=shift)
+        t1_start = t1_end - timedelta(days=days - 1)
+        t2_end = t1_start - timedelta(days=1)
+        t2_start = t2_end - timedelta(days=days - 1)
+        windows += [(label, "T1", t1_start, t1_end), (label, "T2", t2_start, t2_end)]
+    return windows
+
+
+def _empty_matrix(periods=KPI_PERIODS):
+    index = pd.MultiIndex.from_product([list(periods), ["T1", "T2"]], names=["period", "slot"])
+    return pd.DataFrame(0.0, index=index, columns=KPI_COLUMNS)
+
+
+def _finish(totals, periods=KPI_PERIODS):
+    matrix = _empty_matrix(periods)
+    if not totals.empty:
+        matrix.update(totals.set_index(["period", "slot"])[["orders", "revenue", "skus"]].astype(float))
+    matrix["aov"] = (matrix["revenue"] / matrix["orders"]).where(matrix["orders"] > 0, 0.0)
+    return matrix
+
+
+# ------------------ SERVER-SIDE MODE ------------------
+# One round trip: the windows are the same dates the in-memory mode uses (anchored on the
+# page's latest order date), each order counts once per window at its highest
+# order_value, and distinct SKUs come from the raw lines.
+def build_kpi_query(n_windows):
+    window_rows = ", ".join("(?, ?, ?, ?)" for _ in range(n_windows))
+    return f"""
+    WITH windows AS (
+        SELECT period, slot, start_date, end_date
+        FROM (VALUES {window_rows}) AS w(period, slot, start_date, end_date)
+    ),
+    lines AS (
+        SELECT w.period, w.slot, od.order_id, od.order_value, od.product_sku
+        FROM windows w
+        JOIN OrdersDespatch od
+          ON od.order_date >= w.start_date
+         AND od.order_date < DATEADD(DAY, 1, w.end_date)
+    ),
+    order_totals AS (
+        SELECT period, slot, COUNT(*) AS orders, SUM(order_value) AS revenue
+        FROM (
+            SELECT period, slot, order_id, MAX(order_value) AS order_value
+            FROM lines
+            GROUP BY period, slot, order_id
+        ) o
+        GROUP BY period, slot
+    ),
+    sku_totals AS (
+        SELECT period, slot, COUNT(DISTINCT product_sku) AS skus
+        FROM lines
+        GROUP BY period, slot
+    )
+    SELECT s.period, s.slot,
+           COALESCE(o.orders, 0) AS orders,
+           COALESCE(o.revenue, 0) AS revenue,
+           s.skus
+    FROM sku_totals s
+    LEFT JOIN order_totals o ON o.period = s.period AND o.slot = s.slot
+    """
+
+
+def kpi_query_params(windows):
+    params = []
+    for label, slot, start, end in windows:
+        params += [label, slot, pd.Timestamp(start).to_pydatetime(), pd.Timestamp(end).to_pydatetime()]
+    return params
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def load_kpi_matrix(today, periods=KPI_PERIODS):
+    """KPI matrix indexed by (period, slot) with orders / revenue / aov / skus columns."""
+    windows = kpi_windows(today, periods)
+    totals = cached_query(build_kpi_query(len(windows)), params=kpi_query_params(windows))
+    return _finish(totals, periods)
+
+
+# ------------------ IN-MEMORY MODE ------------------
+def kpi_matrix_from_rollup(rollup, sku_bitmaps, today, periods=KPI_PERIODS):
+    """Same matrix from a DailyRollup (orders / revenue, O(1) per window) and SkuBitmaps (distinct SKUs)."""
+    rows = []
+    for label, slot, start, end in kpi_windows(today, periods):
+        totals = rollup.window(start, end)
+        rows.append({
+            "period": label,
+            "slot": slot,
+            "orders": totals["orders"],
+            "revenue": totals["revenue"],
+            "skus": sku_bitmaps.count(start, end),
+        })
+    return _finish(pd.DataFrame(rows), periods)
+
+
+def new_skus_by_period(sku_bitmaps, today, periods=KPI_PERIODS):
+    """Per period, the SKUs sold in T-1 that were not sold in T-2."""
+    bounds = {(label, slot): (start, end) for label, slot, start, end in kpi_windows(today, periods)}
+    result = {}
+    for label in periods:
+        t1 = sku_bitmaps.union(*bounds[(label, "T1")])
+        t2 = sku_bitmaps.union(*bounds[(label, "T2")])
+        result[label] = sku_bitmaps.labels(t1 & ~t2)
+    return result
+
@@ -0,0 +1,146 @@
+# utils/lazy_downloads.py
+
+import hashlib
+import pickle
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import streamlit as st
+
+from utils.fingerprint import data_fingerprint
+from utils.exports import csv_bytes
+
+EXPORT_WORKERS = 2                           # exports are CPU-bound; keep them from starving the pages
+EXPORT_CACHE_MAX_BYTES = 256 * 1024 * 1024   # built payloads kept across reruns / sessions (LRU)
+EXPORT_POLL_SECONDS = 1                      # how often a pending build's status fragment checks back
+
+
+class ExportStore:
+    """Built download payloads keyed by (key, file name, data fingerprint).
+
+    Builds run on a small worker pool, never on the script thread, and concurrent
+    requests for the same payload share one build. Finished payloads are kept LRU
+    up to ``max_bytes`` so re-downloads and other sessions with the same data are free.
+    """
+
+    def __init__(self, max_bytes=EXPORT_CACHE_MAX_BYTES, workers=EXPORT_WORKERS):
+        self.max_bytes = max_bytes
+        self._payloads = OrderedDict()
+        self._size = 0
+        self._pending = {}
+        self._lock = threading.RLock()  # a build that is already done runs its callback inline
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mptc-export")
+
+    def get(self, key):
+        with self._lock:
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+            return payload
+
+    def build(self, key, fn, *args):
+        """Future for ``fn(*args)``'s bytes, reusing a finished or in-flight build of ``key``."""
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(fn, *args)
+                self._pending[key] = future
+                future.add_done_callback(lambda done: self._finish(key, done))
+            return future
+
+    def _finish(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            payload = future.result()
+            if len(payload) > self.max_bytes:
+                return
+            self._size += len(payload) - len(self._payloads.pop(key, b""))
+            self._payloads[key] = payload
+            while self._size > self.max_bytes:
+                _, evicted = self._payloads.popitem(last=False)
+                self._size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._payloads.clear()
+            self._size = 0
+
+
+@st.cache_resource(show_spinner=False)
+def get_export_store():
+    return ExportStore()
+
+
+_frame_fingerprints = {}  # id(frame) → (weak reference to it, fingerprint); dropped when the frame is freed
+
+
+def _fingerprint(data):
+    if isinstance(data, pd.DataFrame):
+        # A frame a page keeps across reruns (cached loads) is hashed once, not on every rerun
+        cached = _frame_fingerprints.get(id(data))
+        if cached is not None and cached[0]() is data:
+            return cached[1]
+        fingerprint = data_fingerprint(data)
+        ref = weakref.ref(data, lambda _, k=id(data): _frame_fingerprints.pop(k, None))
+        _frame_fingerprints[id(data)] = (ref, fingerprint)
+        return fingerprint
+    return hashlib.sha1(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)).hexdigest()
+
+
+def _prepare_label(label):
+    return "⚙️ Prepare " + label.split("Download", 1)[-1].strip()
+
+
+@st.experimental_fragment(run_every=EXPORT_POLL_SECONDS)
+def _build_status(job_key, file_name):
+    # Only this fragment reruns while the build is pending; the page reruns once it is done
+    job = st.session_state.get(job_key)
+    if job is None or job[1].done():
+        st.rerun()
+    st.caption(f"⏳ Preparing {file_name}…")
+
+
+def lazy_download_button(label, build, data, file_name, mime, key, fingerprint=None, **button_kwargs):
+    """A download button whose bytes are only produced after the user asks for them.
+
+    Until then a "Prepare" button is shown and reruns cost one fingerprint of ``data``
+    (memoised per frame; pass ``fingerprint``, e.g. built from the filter inputs, when
+    ``data`` is rebuilt every rerun or doesn't alone determine the output). ``build(data)``
+    runs on the export pool without blocking the page; the result is cached by ``key``,
+    ``file_name`` and the fingerprint.
+    """
+    store = get_export_store()
+    cache_key = (key, file_name, fingerprint or _fingerprint(data))
+    job_key = f"{key}:job"
+    job = st.session_state.get(job_key)
+    if job is not None and job[0] != cache_key:  # inputs changed since the build was asked for
+        st.session_state.pop(job_key)
+        job = None
+
+    payload = store.get(cache_key)
+    if payload is not None:
+        st.session_state.pop(job_key, None)
+    elif job is not None and job[1].done():
+        st.session_state.pop(job_key)
+        if job[1].exception() is not None:
+            st.error(f"❌ Could not prepare {file_name}: {job[1].exception()}")
+        else:
+            payload = job[1].result()  # also covers payloads too large for the store
+        job = None
+    if payload is None:
+        if job is None:
+            if not st.button(_prepare_label(label), key=f"{key}:prepare", **button_kwargs):
+                return
+            st.session_state[job_key] = (cache_key, store.build(cache_key, build, data))
+        _build_status(job_key, file_name)
+        return
+    st.download_button(label, data=payload, file_name=file_name, mime=mime, key=f"{key}:download", **button_kwargs)
+
+
+def lazy_csv_download(label, df, file_name, key, **button_kwargs):
+    lazy_download_button(label, csv_bytes, df, file_name, "text/csv", key, **button_kwargs)
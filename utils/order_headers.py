@@ -0,0 +1,68 @@
+# utils/order_headers.py
+
+import numpy as np
+import pandas as pd
+
+HEADER_COLUMNS = ["order_id", "order_channel", "order_date", "despatch_date", "order_value", "product_sku"]
+
+
+class OrderHeaders:
+    """One row per order, taken from its highest-order_value line, plus a line → order index.
+
+    This is the pages' "sort by order_value, drop_duplicates on order_id" rule done once
+    per dataset refresh; order-level KPIs become masked sums over ``table``. Date and
+    channel filters are evaluated on the lines, as the pages did, so an order whose lines
+    were despatched on different days is selected when any of its lines is in range.
+    """
+
+    def __init__(self, table, lines, line_order, header_line):
+        self.table = table              # header position == order code
+        self.lines = lines              # the source frame (filters read its date / channel columns)
+        self.line_order = line_order    # int32 header position per source line (-1: no order_id)
+        self.header_line = header_line  # bool Series over the source frame's index: the line each header came from
+
+    @classmethod
+    def from_frame(cls, df):
+        codes, _ = pd.factorize(df["order_id"], sort=False)
+        values = df["order_value"].to_numpy(dtype="float64", na_value=np.nan)
+        values = np.where(np.isnan(values), -np.inf, values)  # NaN values never win, as with sort_values
+
+        # Primary key order code, then order_value descending → first line of each code wins
+        order = np.lexsort((-values, codes))
+        order = order[codes[order] >= 0]
+        sorted_codes = codes[order]
+        first = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if len(order) else order
+        winners = order[first]
+
+        table = df.iloc[winners][[c for c in HEADER_COLUMNS if c in df.columns]].reset_index(drop=True)
+        table["lines"] = np.bincount(sorted_codes, minlength=len(table)).astype("int32")
+        header_line = np.zeros(len(df), dtype=bool)
+        header_line[winners] = True
+        return cls(table, df, codes.astype("int32"), pd.Series(header_line, index=df.index))
+
+    def select(self, despatch=None, order=None, channels=None):
+        """Boolean header mask of the orders with any line matching every filter.
+
+        ``despatch`` / ``order`` are inclusive (start, end) pairs, either end may be None.
+        """
+        lines = self.line_order >= 0
+        for column, bounds in (("despatch_date", despatch), ("order_date", order)):
+            if bounds is None:
+                continue
+            start, end = bounds
+            dates = self.lines[column]
+            if start is not None:
+                lines &= (dates >= pd.Timestamp(start)).to_numpy()
+            if end is not None:
+                lines &= (dates <= pd.Timestamp(end)).to_numpy()
+        if channels is not None:
+            lines &= self.lines["order_channel"].isin(channels).to_numpy()
+        return np.bincount(self.line_order[lines], minlength=len(self.table)) > 0
+
+    def orders(self, mask):
+        return self.table[mask]
+
+    def totals(self, mask):
+        revenue = float(np.nansum(self.table["order_value"].to_numpy()[mask]))
+        orders = int(np.count_nonzero(mask))
+        return {"orders": orders, "revenue": revenue, "aov": revenue / orders if orders else 0.0}
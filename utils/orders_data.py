@@ -0,0 +1,244 @@
+# utils/orders_data.py
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+from dateutil.relativedelta import relativedelta
+
+from utils.compact_schema import ORDERS_SCHEMA, apply_schema, concat_compact
+from utils.date_index import DateIndex
+from utils.db import run_query
+from utils.snapshot_store import SnapshotStore
+
+# ------------------ INCREMENTAL LOAD SETTINGS ------------------
+RECHECK_DAYS = 3                          # re-fetch this many days behind the watermark (late updates)
+FULL_RELOAD_AFTER = timedelta(hours=24)   # safety net: full re-pull at most once a day
+REFRESH_INTERVAL = 3600                   # seconds between delta refreshes of the shared dataset
+
+
+def months_ago(months):
+    return lambda: (datetime.now() - relativedelta(months=months)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def since(date_str):
+    return lambda: pd.Timestamp(date_str).to_pydatetime()
+
+
+class IncrementalLoader:
+    """Keeps an OrdersDespatch window resident and tops it up from date watermarks.
+
+    ``date_columns`` is a list of ``(sql_expression, frame_column)`` pairs; the first
+    one bounds the window and partitions the snapshot. The first call pulls the whole
+    window. Later calls only fetch rows whose date in *any* of the columns is at or
+    after ``watermark - RECHECK_DAYS`` and swap them into the resident frame, so new
+    orders and late despatches are both picked up without re-reading the window.
+    With a ``snapshot`` name, the frame is also kept in a local SnapshotStore so a
+    restarted process starts from disk and only fetches the delta. A ``schema``
+    (see utils.compact_schema) is applied to every fetched batch.
+    """
+
+    def __init__(self, select_sql, date_columns, window_start,
+                 recheck_days=RECHECK_DAYS, full_reload_after=FULL_RELOAD_AFTER, snapshot=None, schema=None):
+        self.select_sql = select_sql
+        self.date_columns = date_columns
+        self.date_column = date_columns[0][1]
+        self.window_start = window_start
+        self.recheck_days = recheck_days
+        self.full_reload_after = full_reload_after
+        self.schema = schema
+        self.schema_report = None  # bytes saved per column, from the last full load
+        self._frame = None
+        self._watermarks = {}
+        self._last_full_load = None
+        self._lock = threading.Lock()
+        self.store = SnapshotStore(snapshot, self.date_column, source=select_sql) if snapshot else None
+
+    @property
+    def watermark(self):
+        return self._watermarks.get(self.date_column)
+
+    def invalidate(self):
+        with self._lock:
+            self._frame = None
+            self._watermarks = {}
+            self._last_full_load = None
+            if self.store:
+                self.store.clear()
+
+    def refresh(self):
+        with self._lock:
+            window_start = pd.Timestamp(self.window_start())
+            if self._frame is None:
+                self._restore_snapshot(window_start)
+
+            window_sql = f"{self.date_columns[0][0]} >= ?"
+            if self._needs_full_load():
+                self._frame = self._fetch(window_sql, [window_start], report=True)
+                self._last_full_load = datetime.now()
+                rewrite_from = None
+            else:
+                recheck_from = {
+                    col: max(window_start, self._watermarks[col] - timedelta(days=self.recheck_days))
+                    for _, col in self.date_columns
+                }
+                delta_sql = " OR ".join(f"{sql} >= ?" for sql, _ in self.date_columns)
+                delta = self._fetch(
+                    f"{window_sql} AND ({delta_sql})",
+                    [window_start] + [recheck_from[col] for _, col in self.date_columns],
+                )
+                stale = pd.Series(False, index=self._frame.index)
+                for _, col in self.date_columns:
+                    stale |= self._frame[col] >= recheck_from[col]
+                kept = self._frame[(self._frame[self.date_column] >= window_start) & ~stale]
+                self._frame = concat_compact([kept, delta])
+
+                # Snapshot partitions follow the first date column → rewrite from the oldest month touched
+                oldest = recheck_from[self.date_column]
+                if not delta.empty:
+                    oldest = min(oldest, delta[self.date_column].min())
+                rewrite_from = oldest.strftime("%Y-%m")
+
+            # Keep the resident frame ordered by the window column → date ranges are slices
+            self._frame = self._frame.sort_values(self.date_column, kind="stable", ignore_index=True)
+            for _, col in self.date_columns:
+                dates = self._frame[col]
+                self._watermarks[col] = dates.max() if dates.notna().any() else window_start
+            self._save_snapshot(rewrite_from)
+            return self._frame
+
+    def _restore_snapshot(self, window_start):
+        if not self.store:
+            return
+        try:
+            meta = self.store.meta()
+            frame = self.store.read(start=window_start) if meta.get("last_full_load") else None
+        except Exception:
+            frame = None  # unreadable snapshot → fall back to a full pull
+        if frame is not None:
+            self._frame = apply_schema(frame, self.schema) if self.schema else frame
+            self._watermarks = {col: pd.Timestamp(ts) for col, ts in meta.get("watermarks", {}).items()}
+            self._last_full_load = datetime.fromisoformat(meta["last_full_load"])
+
+    def _save_snapshot(self, since_month):
+        if not self.store:
+            return
+        try:
+            self.store.write(
+                self._frame,
+                watermark=self.watermark,
+                since_month=since_month,
+                meta={
+                    "last_full_load": self._last_full_load.isoformat(),
+                    "watermarks": {col: ts.isoformat() for col, ts in self._watermarks.items()},
+                },
+            )
+        except Exception:
+            pass  # the snapshot is only a warm-start cache; never fail the page over it
+
+    def _needs_full_load(self):
+        return (
+            self._frame is None
+            or any(col not in self._watermarks for _, col in self.date_columns)
+            or datetime.now() - self._last_full_load >= self.full_reload_after
+        )
+
+    def _fetch(self, where_sql, params, report=False):
+        query = f"{self.select_sql} WHERE {where_sql}"
+        df = run_query(query, params=[p.to_pydatetime() for p in params])
+        for _, col in self.date_columns:
+            df[col] = pd.to_datetime(df[col]).dt.normalize()
+        if self.schema:
+            if report:
+                df, self.schema_report = apply_schema(df, self.schema, report=True)
+            else:
+                df = apply_schema(df, self.schema)
+        return df
+
+
+# ------------------ SHARED ORDERS DATASET ------------------
+# One superset of the columns and dates every page needs:
+#   page 1 → last 12 months by order date, page 3 → last 12 months by despatch date,
+#   pages 6 & 7 → everything since 2024-01-01 (with product category).
+ORDERS_SOURCE = dict(
+    select_sql="""
+        SELECT od.order_id, od.order_channel, od.order_date, od.despatch_date, od.order_value,
+               od.order_cust_postcode, od.product_sku, od.product_name, p.product_category,
+               od.product_qty, od.product_price, od.cost_price, od.customer_name,
+               od.order_courier_service
+        FROM OrdersDespatch od
+        LEFT JOIN Products p ON od.product_sku = p.product_sku
+    """,
+    date_columns=[("od.order_date", "order_date"), ("od.despatch_date", "despatch_date")],
+    window_start=since("2024-01-01"),
+    snapshot="orders",
+    schema=ORDERS_SCHEMA,
+)
+
+
+class SharedOrdersDataset:
+    """Process-wide holder of the orders frame; pages take projected views of it."""
+
+    def __init__(self, loader, refresh_interval=REFRESH_INTERVAL):
+        self.loader = loader
+        self.refresh_interval = refresh_interval
+        self._frame = None
+        self._loaded_at = 0.0
+        self._derived = {}  # name → (frame it was built from, value)
+        self._lock = threading.Lock()
+
+    def frame(self):
+        with self._lock:
+            if self._frame is None or time.monotonic() - self._loaded_at >= self.refresh_interval:
+                # Swap in a new frame; views already handed out keep pointing at the old one
+                self._frame = self.loader.refresh()
+                self._loaded_at = time.monotonic()
+            return self._frame
+
+    def invalidate(self):
+        with self._lock:
+            self.loader.invalidate()
+            self._frame = None
+            self._derived.clear()
+
+    def derived(self, name, build, frame=None):
+        """``build(frame)`` memoised per frame: rebuilt only after a refresh swaps the frame in.
+
+        Pass the ``frame`` a page already took this run to keep everything it derives from
+        that same frame, even if a refresh swaps a newer one in meanwhile.
+        """
+        frame = self.frame() if frame is None else frame
+        with self._lock:
+            cached = self._derived.get(name)
+            if cached is not None and cached[0] is frame:
+                return cached[1]
+        value = build(frame)
+        with self._lock:
+            if frame is self._frame:  # a superseded frame's value is returned but not cached
+                self._derived[name] = (frame, value)
+        return value
+
+    def date_index(self, date_column, frame=None):
+        return self.derived(f"date_index:{date_column}", lambda f: DateIndex(f, date_column), frame=frame)
+
+    def view(self, columns, date_column=None, start=None, end=None, frame=None):
+        """``columns`` of the shared frame; with ``date_column`` the rows are in date order and
+        limited to [start, end] by binary search.
+
+        The projection is lazy under pandas 3 (copy-on-write) and a copy before that. Treat it
+        as read-only either way: derive new columns with ``assign`` rather than writing into it.
+        """
+        if date_column is None:
+            return (self.frame() if frame is None else frame)[list(columns)]
+        return self.date_index(date_column, frame=frame).slice(start, end)[list(columns)]
+
+
+@st.cache_resource(show_spinner=False)
+def get_orders_dataset():
+    return SharedOrdersDataset(IncrementalLoader(**ORDERS_SOURCE))
+
+
+def orders_view(columns, date_column=None, start=None, end=None, frame=None):
+    return get_orders_dataset().view(columns, date_column=date_column, start=start, end=end, frame=frame)
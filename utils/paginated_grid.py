@@ -0,0 +1,59 @@
+# utils/paginated_grid.py
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.html_tables import paginate
+
+GRID_PAGE_SIZE = 100  # rows sent to the browser per page
+NO_SORT = "—"
+
+
+def sort_keys(values, descending=False):
+    """Unique int64 key per row: rank of the value (NaN last in both directions), ties by position.
+
+    Unique keys make a partial selection of any page exact and identical to a stable sort.
+    """
+    try:
+        codes, uniques = pd.factorize(values, sort=True, use_na_sentinel=True)
+    except TypeError:  # mixed types in an object column → order by text
+        codes, uniques = pd.factorize(values.where(values.isna(), values.astype(str)), sort=True, use_na_sentinel=True)
+    n_unique = len(uniques)
+    if descending:
+        codes = np.where(codes >= 0, n_unique - 1 - codes, codes)
+    codes = np.where(codes < 0, n_unique, codes).astype("int64")
+    return codes * len(codes) + np.arange(len(codes), dtype="int64")
+
+
+def page_rows(df, start, stop, sort_by=None, descending=False):
+    """Positions of rows ``start:stop`` of ``df`` in the requested order, without sorting the whole frame."""
+    if sort_by is None:
+        return np.arange(start, stop)
+    keys = sort_keys(df[sort_by], descending)
+    if stop - start >= len(keys):
+        picked = np.arange(len(keys))
+    else:
+        kth = [start, stop - 1] if stop - 1 > start else [start]
+        picked = np.argpartition(keys, kth)[start:stop]  # exactly the rows ranked start..stop-1
+    return picked[np.argsort(keys[picked])]
+
+
+def data_grid(df, key, page_size=GRID_PAGE_SIZE, columns=None, height=None, label="rows"):
+    """One page of ``df`` in st.dataframe; column choice, sorting and paging all happen here.
+
+    Only the visible page (and only the chosen columns) is Arrow-serialised for the browser.
+    """
+    all_columns = list(df.columns)
+    col_pick, col_sort, col_dir = st.columns([0.55, 0.3, 0.15])
+    with col_pick:
+        shown = st.multiselect("Columns", all_columns, default=columns or all_columns, key=f"{key}:columns")
+    with col_sort:
+        sort_by = st.selectbox("Sort by", [NO_SORT] + all_columns, key=f"{key}:sort")
+    with col_dir:
+        descending = st.toggle("Descending", key=f"{key}:descending")
+
+    start, stop = paginate(len(df), key=f"{key}:page", page_size=page_size, label=label)
+    rows = page_rows(df, start, stop, None if sort_by == NO_SORT else sort_by, descending)
+    page = df.iloc[rows][shown or all_columns]
+    st.dataframe(page, use_container_width=True, height=height)
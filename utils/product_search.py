@@ -0,0 +1,168 @@
+# utils/product_search.py
+
+import re
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.fingerprint import data_fingerprint
+
+# Searchable columns → weight of a match in that column
+SEARCH_FIELDS = {
+    "product_sku": 4.0,
+    "ean_barcode": 4.0,
+    "product_name": 2.0,
+    "customs_description": 1.0,
+    "product_description": 1.0,
+}
+ID_FIELDS = ("product_sku", "ean_barcode")  # also indexed as one compact token ("ABC-12 3" → "abc123")
+SEARCH_LIMIT = 500
+
+EXACT, PREFIX, FUZZY = 1.0, 0.8, 0.6  # match quality multipliers
+MIN_PREFIX = 2        # shorter query tokens only match exactly
+MIN_FUZZY = 4         # shorter query tokens are never matched fuzzily
+FUZZY_SIMILARITY = 0.35  # trigram Jaccard needed for a fuzzy match ("cottn" ~ "cotton")
+
+_TOKEN = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text):
+    return _TOKEN.findall(str(text).lower())
+
+
+def compact(text):
+    return "".join(tokenize(text))
+
+
+def trigrams(token):
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _csr(keys, values, n_keys):
+    """Group ``values`` by integer ``keys`` → (values ordered by key, offsets per key)."""
+    order = np.argsort(keys, kind="stable")
+    return values[order], np.searchsorted(keys[order], np.arange(n_keys + 1))
+
+
+class ProductSearchIndex:
+    """Inverted token index over the product text columns, with prefix and trigram fuzzy lookup.
+
+    Every query token must match (exactly, as a prefix, or fuzzily) in some searchable
+    column; rows are ranked by the summed best match of each token, weighted by column.
+    """
+
+    def __init__(self, df, fields=SEARCH_FIELDS):
+        self.n_rows = len(df)
+        vocab = {}
+        token_ids, rows, weights = [], [], []
+        for col, weight in fields.items():
+            if col not in df.columns:
+                continue
+            for row, text in enumerate(df[col].to_numpy()):
+                if pd.isna(text):  # None / NaN / pd.NA / NaT are not text
+                    continue
+                tokens = set(tokenize(text))
+                if col in ID_FIELDS:
+                    tokens.add(compact(text))
+                for token in tokens:
+                    if token:
+                        token_ids.append(vocab.setdefault(token, len(vocab)))
+                        rows.append(row)
+                        weights.append(weight)
+
+        # Renumber tokens in sorted order so a prefix is one contiguous id range
+        words = np.array(list(vocab), dtype=object)
+        order = np.argsort(words.astype(str), kind="stable")
+        rank = np.empty(len(order), dtype="int64")
+        rank[order] = np.arange(len(order))
+        self.vocab = words[order].astype(str)
+        token_ids = rank[np.asarray(token_ids, dtype="int64")]
+
+        postings = np.rec.fromarrays(
+            [np.asarray(rows, dtype="int64"), np.asarray(weights, dtype="float64")], names="row,weight"
+        ) if rows else np.rec.fromarrays([np.empty(0, "int64"), np.empty(0, "float64")], names="row,weight")
+        self._postings, self._offsets = _csr(token_ids, postings, len(self.vocab))
+
+        gram_ids, gram_tokens, gram_vocab = [], [], {}
+        self._gram_counts = np.zeros(len(self.vocab), dtype="int32")
+        for token_id, token in enumerate(self.vocab):
+            grams = trigrams(token)
+            self._gram_counts[token_id] = len(grams)
+            for gram in grams:
+                gram_ids.append(gram_vocab.setdefault(gram, len(gram_vocab)))
+                gram_tokens.append(token_id)
+        self._gram_vocab = gram_vocab
+        self._gram_tokens, self._gram_offsets = _csr(
+            np.asarray(gram_ids, dtype="int64"), np.asarray(gram_tokens, dtype="int64"), len(gram_vocab)
+        )
+
+    def _candidates(self, token):
+        """Matching vocabulary as (first id, end id, quality) ranges; prefixes are one contiguous range."""
+        ranges = []
+        lo = int(np.searchsorted(self.vocab, token, "left"))
+        exact = lo < len(self.vocab) and self.vocab[lo] == token
+        if exact:
+            ranges.append((lo, lo + 1, EXACT))
+        if len(token) >= MIN_PREFIX:
+            hi = int(np.searchsorted(self.vocab, token + "\uffff", "left"))
+            start = lo + 1 if exact else lo
+            if hi > start:
+                ranges.append((start, hi, PREFIX))
+        if len(token) >= MIN_FUZZY and not ranges:
+            grams = [self._gram_vocab[g] for g in trigrams(token) if g in self._gram_vocab]
+            if grams:
+                hits = np.concatenate([self._gram_tokens[self._gram_offsets[g]:self._gram_offsets[g + 1]] for g in grams])
+                shared = np.bincount(hits, minlength=len(self.vocab))
+                similarity = shared / (len(trigrams(token)) + self._gram_counts - shared)
+                ranges.extend((t, t + 1, FUZZY * similarity[t]) for t in np.flatnonzero(similarity >= FUZZY_SIMILARITY))
+        return ranges
+
+    def _token_scores(self, token, ranges=None):
+        """Best weighted match of ``token`` per row (0: no match)."""
+        scores = np.zeros(self.n_rows, dtype="float64")
+        ranges = self._candidates(token) if ranges is None else ranges
+        if not ranges:
+            return scores
+        slices = [(self._offsets[lo], self._offsets[hi], quality) for lo, hi, quality in ranges]
+        hits = np.concatenate([self._postings[start:end] for start, end, _ in slices])
+        quality = np.repeat([q for _, _, q in slices], [end - start for start, end, _ in slices])
+        np.maximum.at(scores, hits["row"], quality * hits["weight"])
+        return scores
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """(row positions, scores) of the best ``limit`` matches for ``query``, best first."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not self.n_rows:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float64")
+        total = np.zeros(self.n_rows, dtype="float64")
+        matched = np.ones(self.n_rows, dtype=bool)
+        for token in tokens:
+            scores = self._token_scores(token)
+            matched &= scores > 0
+            total += scores
+        whole = compact(query)
+        if len(tokens) > 1:  # "abc 123" also scores rows whose compact SKU / EAN is "abc123"
+            lo = int(np.searchsorted(self.vocab, whole, "left"))
+            if lo < len(self.vocab) and self.vocab[lo] == whole:
+                whole_scores = self._token_scores(whole, [(lo, lo + 1, EXACT)])
+                matched |= whole_scores > 0
+                total += whole_scores
+
+        rows = np.flatnonzero(matched)
+        if len(rows) > limit:
+            rows = rows[np.argpartition(-total[rows], limit - 1)[:limit]]
+        rows = rows[np.lexsort((rows, -total[rows]))]
+        return rows, total[rows]
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _search_index(fingerprint, _df):
+    return ProductSearchIndex(_df)
+
+
+def get_search_index(df):
+    """ProductSearchIndex for ``df``, rebuilt only when the searchable text changes."""
+    columns = [col for col in SEARCH_FIELDS if col in df.columns]
+    return _search_index(data_fingerprint(df[columns]), df)
@@ -0,0 +1,47 @@
+# utils/query_executor.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
+
+from utils.db import POOL_MAX_SIZE, run_query
+
+# Leave headroom in the connection pool for queries running on the script threads
+QUERY_WORKERS = max(1, POOL_MAX_SIZE // 2)
+
+
+@st.cache_resource(show_spinner=False)
+def get_query_executor():
+    return ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="mptc-query")
+
+
+def _in_script_context(fn, ctx):
+    # Lets st.cache_data / st.error inside fn behave as if called from the page itself
+    def run(*args, **kwargs):
+        thread = threading.current_thread()
+        add_script_run_ctx(thread, ctx)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            # add_script_run_ctx(thread, None) keeps the current context; detach it explicitly
+            # so the pooled thread does not hold on to this session's run
+            setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+    return run
+
+
+def submit(fn, *args, **kwargs):
+    """Run ``fn(*args, **kwargs)`` on the shared pool and return its Future."""
+    return get_query_executor().submit(_in_script_context(fn, get_script_run_ctx()), *args, **kwargs)
+
+
+def submit_query(query, params=None):
+    """Future for a parameterised query (see utils.db.run_query)."""
+    return submit(run_query, query, params)
+
+
+def gather(futures):
+    """Wait on a ``{name: future}`` dict and return ``{name: result}``; the first error is raised."""
+    return {name: future.result() for name, future in futures.items()}
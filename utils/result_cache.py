@@ -0,0 +1,187 @@
+# utils/result_cache.py
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from contextlib import contextmanager
+import threading
+import time
+
+import pyarrow as pa
+
+from utils.db import run_query
+from utils.snapshot_store import CACHE_ROOT
+
+# ------------------ RESULT CACHE SETTINGS ------------------
+# /home is shared by every scaled-out App Service instance, so one replica's fetch serves all.
+RESULT_CACHE_PATH = os.environ.get("MPTC_RESULT_CACHE", os.path.join(CACHE_ROOT, "result_cache.sqlite"))
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024   # LRU-evicted beyond this
+RESULT_CACHE_MAX_AGE = 6 * 3600              # seconds; bounds staleness from in-place updates
+VERSION_PROBE_TTL = 60                       # seconds a data-version probe is trusted in-process
+
+# Cheap fingerprints of each table's contents; any change → new cache keys
+VERSION_PROBES = {
+    "OrdersDespatch": """
+        SELECT COUNT_BIG(*) AS row_count,
+               MAX(order_date) AS max_order_date,
+               MAX(despatch_date) AS max_despatch_date
+        FROM OrdersDespatch
+    """,
+    "Products": """
+        SELECT COUNT_BIG(*) AS row_count, CHECKSUM_AGG(BINARY_CHECKSUM(*)) AS checksum
+        FROM Products
+    """,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    payload BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+_probe_cache = {}
+_probe_lock = threading.Lock()
+
+log = logging.getLogger(__name__)
+_bypass_logged = False
+
+
+def normalize_sql(query):
+    return " ".join(query.split())
+
+
+def data_version(tables):
+    """Combined version string of ``tables``, re-probed at most every VERSION_PROBE_TTL seconds."""
+    parts = []
+    for table in sorted(tables):
+        with _probe_lock:
+            cached = _probe_cache.get(table)
+            if cached and time.monotonic() - cached[1] < VERSION_PROBE_TTL:
+                parts.append(cached[0])
+                continue
+        probe = run_query(VERSION_PROBES[table])
+        version = f"{table}:" + json.dumps(probe.iloc[0].astype(str).tolist() if not probe.empty else [])
+        with _probe_lock:
+            _probe_cache[table] = (version, time.monotonic())
+        parts.append(version)
+    return "|".join(parts)
+
+
+def cache_key(query, params, version):
+    text = json.dumps([normalize_sql(query), [str(p) for p in (params or [])], version])
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _to_bytes(df):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=pa.ipc.IpcWriteOptions(compression="zstd")) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _from_bytes(payload):
+    return pa.ipc.open_stream(pa.py_buffer(payload)).read_all().to_pandas()
+
+
+class ResultCache:
+    """SQLite-backed, size-bounded LRU of query results shared through the filesystem."""
+
+    def __init__(self, path=RESULT_CACHE_PATH, max_bytes=RESULT_CACHE_MAX_BYTES, max_age=RESULT_CACHE_MAX_AGE):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # Default rollback journal: WAL is not safe on the network share
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:  # commit on success, roll back on error
+                yield db
+        finally:
+            db.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT payload FROM results WHERE key = ? AND created >= ?", (key, now - self.max_age)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+        return _from_bytes(row[0])
+
+    def put(self, key, df):
+        payload = _to_bytes(df)
+        if len(payload) > self.max_bytes:
+            return
+        now = time.time()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO results (key, payload, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, sqlite3.Binary(payload), len(payload), now, now),
+            )
+            db.execute("DELETE FROM results WHERE created < ?", (now - self.max_age,))
+            self._evict(db)
+
+    def _evict(self, db):
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in db.execute("SELECT key, size FROM results ORDER BY last_used ASC").fetchall():
+            db.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM results")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+
+def cached_query(query, params=None, tables=("OrdersDespatch",)):
+    """run_query() through the shared result cache; any cache failure falls back to the database."""
+    try:
+        cache = get_result_cache()
+        key = cache_key(query, params, data_version(tables))
+        df = cache.get(key)
+        if df is not None:
+            return df
+    except Exception:
+        # Cache is best-effort (share unavailable, probe failed, ...) → go straight to SQL,
+        # but say so once per process rather than silently running uncached forever
+        global _bypass_logged
+        if not _bypass_logged:
+            _bypass_logged = True
+            log.warning("Result cache unavailable, querying the database directly", exc_info=True)
+        return run_query(query, params)
+
+    df = run_query(query, params)
+    try:
+        cache.put(key, df)
+    except (sqlite3.Error, OSError, pa.ArrowException):
+        pass
+    return df
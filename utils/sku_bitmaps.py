@@ -0,0 +1,82 @@
+# utils/sku_bitmaps.py
+
+import numpy as np
+import pandas as pd
+
+# Set bits per byte value → popcount of a packed bitmap is one table lookup + sum
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class SkuBitmaps:
+    """Packed bitmap of the SKUs sold per (day, channel), one bit per SKU.
+
+    A distinct-SKU count over any date range and channel subset is the popcount of
+    the OR of the selected bitmaps; set questions ("sold in T-1 but not in T-2") are
+    plain ``&`` / ``~`` on the returned bitmaps.
+    """
+
+    def __init__(self, days, channels, skus, bits):
+        self.days = days          # dense DatetimeIndex
+        self.channels = channels  # Index of channel labels; lines without a channel use the last slot
+        self.skus = skus          # Index of SKU labels, position == bit number
+        self.bits = bits          # uint8 array (day, channel slot, byte)
+
+    @classmethod
+    def from_frame(cls, df, date_column="order_date"):
+        lines = df[[date_column, "order_channel", "product_sku"]]
+        lines = lines[lines[date_column].notna() & lines["product_sku"].notna()]
+        sku_codes, skus = _codes(lines["product_sku"])
+        channel_codes, channels = _codes(lines["order_channel"])
+        n_bytes = max(1, -(-len(skus) // 8))
+        if lines.empty:
+            return cls(pd.DatetimeIndex([]), channels, skus, np.zeros((0, len(channels) + 1, n_bytes), np.uint8))
+
+        dates = lines[date_column]
+        days = pd.date_range(dates.min(), dates.max(), freq="D")
+        day_codes = (dates.to_numpy() - days[0].to_datetime64()) // np.timedelta64(1, "D")
+        channel_codes = np.where(channel_codes < 0, len(channels), channel_codes)
+
+        # One bit per distinct (day, channel, sku); packbits order → bit 7 of byte 0 is SKU 0
+        n_slots = len(channels) + 1
+        cell = (day_codes * n_slots + channel_codes).astype("int64")
+        keys = np.unique(cell * len(skus) + sku_codes)
+        cell, sku = np.divmod(keys, len(skus))
+        bits = np.zeros(len(days) * n_slots * n_bytes, dtype=np.uint8)
+        np.bitwise_or.at(bits, cell * n_bytes + sku // 8, (0x80 >> (sku % 8)).astype(np.uint8))
+        return cls(days, channels, skus, bits.reshape(len(days), n_slots, n_bytes))
+
+    def union(self, start, end, channels=None):
+        """Bitmap of SKUs sold in the inclusive day range [start, end], optionally for some channels."""
+        empty = np.zeros(self.bits.shape[2], dtype=np.uint8)
+        if not len(self.days):
+            return empty
+        i = max((pd.Timestamp(start).normalize() - self.days[0]).days, 0)
+        j = min((pd.Timestamp(end).normalize() - self.days[0]).days + 1, len(self.days))
+        if j <= i:
+            return empty
+        block = self.bits[i:j]
+        if channels is not None:
+            slots = self.channels.get_indexer(list(channels))
+            block = block[:, slots[slots >= 0]]
+        if not block.size:
+            return empty
+        return np.bitwise_or.reduce(block.reshape(-1, block.shape[2]), axis=0)
+
+    def count(self, start, end, channels=None):
+        return self.cardinality(self.union(start, end, channels))
+
+    @staticmethod
+    def cardinality(bitmap):
+        return int(_POPCOUNT[bitmap].sum(dtype=np.int64))
+
+    def labels(self, bitmap):
+        """SKU labels whose bit is set in ``bitmap``."""
+        positions = np.flatnonzero(np.unpackbits(bitmap)[:len(self.skus)])
+        return self.skus[positions].tolist()
+
+
+def _codes(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy().astype("int64"), pd.Index(series.cat.categories)
+    codes, uniques = pd.factorize(series)
+    return codes.astype("int64"), pd.Index(uniques)
@@ -0,0 +1,80 @@
+# utils/sku_leaderboard.py
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+LEADERBOARD_COLUMNS = ["product_sku", "product_name", "sold_qty", "unique_orders"]
+LEADERBOARD_MEMO_SIZE = 32  # (date range, channels) leaderboards kept per dataset frame
+
+
+class SkuLeaderboard:
+    """Sold quantity and unique orders per SKU, with top / bottom N by partial selection.
+
+    ``unique_orders`` counts the orders whose deciding line (see OrderHeaders) is for
+    the SKU, so each order is attributed to exactly one SKU, as on page 1.
+    """
+
+    def __init__(self, table):
+        self.table = table  # one row per (product_sku, product_name), unordered
+        self._qty = table["sold_qty"].to_numpy(dtype="float64", na_value=np.nan)
+
+    @classmethod
+    def from_lines(cls, lines, header_line):
+        """One grouped pass over order ``lines``; ``header_line`` is OrderHeaders.header_line."""
+        flags = header_line.reindex(lines.index, fill_value=False).to_numpy(dtype="int64")
+        table = (
+            lines[["product_sku", "product_name", "product_qty"]]
+            .assign(unique_orders=flags)
+            .groupby(["product_sku", "product_name"], observed=True, sort=False)
+            .agg(sold_qty=("product_qty", "sum"), unique_orders=("unique_orders", "sum"))
+            .reset_index()
+        )
+        return cls(table[LEADERBOARD_COLUMNS])
+
+    def _select(self, n, largest):
+        keys = -self._qty if largest else self._qty
+        keys = np.where(np.isnan(keys), np.inf, keys)  # missing quantities never make either list first
+        n = min(n, len(keys))
+        if n == 0:
+            return self.table.iloc[:0]
+        picked = np.argpartition(keys, n - 1)[:n] if n < len(keys) else np.arange(len(keys))
+        picked = picked[np.lexsort((picked, keys[picked]))]  # only the n picked rows are sorted
+        return self.table.iloc[picked].reset_index(drop=True)
+
+    def top(self, n):
+        return self._select(n, largest=True)
+
+    def bottom(self, n):
+        return self._select(n, largest=False)
+
+
+class LeaderboardMemo:
+    """LRU of leaderboards for one dataset frame, keyed by (start, end, channels).
+
+    Hold it through ``SharedOrdersDataset.derived`` so it is dropped with the frame.
+    """
+
+    def __init__(self, max_entries=LEADERBOARD_MEMO_SIZE):
+        self.max_entries = max_entries
+        self._boards = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, build):
+        with self._lock:
+            board = self._boards.get(key)
+            if board is not None:
+                self._boards.move_to_end(key)
+                return board
+        board = build()
+        with self._lock:
+            self._boards[key] = board
+            while len(self._boards) > self.max_entries:
+                self._boards.popitem(last=False)
+        return board
+
+
+def leaderboard_key(start, end, channels):
+    return pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), tuple(sorted(map(str, channels)))
@@ -0,0 +1,173 @@
+# utils/snapshot_store.py
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+# ------------------ STORE SETTINGS ------------------
+# Azure App Service keeps /home across restarts and redeploys, so the default lives there.
+CACHE_ROOT = os.environ.get("MPTC_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".mptc_cache"))
+STORE_VERSION = 1          # bump to orphan every snapshot written by an older layout
+COMPRESSION = "zstd"        # compressed feather is decoded in full on read, never memory-mapped
+MANIFEST_FILE = "manifest.json"
+
+
+def _logical_type(arrow_type):
+    # Dictionary index width depends on how many categories a load happened to see
+    return arrow_type.value_type if pa.types.is_dictionary(arrow_type) else arrow_type
+
+
+def schema_fingerprint(schema, source=""):
+    text = f"v{STORE_VERSION}|{source}|" + "|".join(f"{f.name}:{_logical_type(f.type)}" for f in schema)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def source_fingerprint(source):
+    return hashlib.sha1(" ".join(source.split()).encode("utf-8")).hexdigest()[:16]
+
+
+class SnapshotStore:
+    """Month-partitioned, compressed Arrow snapshots of a DataFrame on local disk.
+
+    Layout: ``<CACHE_ROOT>/v<STORE_VERSION>/<name>/<YYYY-MM>.arrow`` plus a
+    ``manifest.json`` holding the schema fingerprint, watermark and partition list.
+    Only the requested months and columns are read; each partition is zstd-compressed,
+    so it is decoded into memory in full rather than memory-mapped.
+    """
+
+    def __init__(self, name, date_column, source="", root=CACHE_ROOT):
+        self.name = name
+        self.date_column = date_column
+        self.source = source_fingerprint(source)
+        self.path = os.path.join(root, f"v{STORE_VERSION}", name)
+
+    # ---- manifest ----
+    def manifest(self):
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILE), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if manifest.get("source") == self.source else None
+
+    def _write_manifest(self, manifest):
+        self._atomic_write(MANIFEST_FILE, lambda tmp: self._dump_json(manifest, tmp))
+
+    @staticmethod
+    def _dump_json(obj, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, indent=1)
+
+    # ---- write ----
+    def write(self, df, watermark=None, since_month=None, meta=None):
+        """Persist ``df``. With ``since_month`` (``YYYY-MM``) only that month onwards is rewritten."""
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        # Fix dictionary index width so partitions written at different times share one schema
+        table = table.cast(pa.schema([
+            f.with_type(pa.dictionary(pa.int32(), f.type.value_type)) if pa.types.is_dictionary(f.type) else f
+            for f in table.schema
+        ]))
+        fingerprint = schema_fingerprint(table.schema, self.source)
+        manifest = self.manifest()
+
+        if manifest is None or manifest.get("fingerprint") != fingerprint or since_month is None:
+            self.clear()
+            since_month = None
+            partitions = {}
+        else:
+            partitions = dict(manifest.get("partitions", {}))
+
+        os.makedirs(self.path, exist_ok=True)
+        month_keys = pd.to_datetime(df[self.date_column]).dt.strftime("%Y-%m")
+        for month, index in month_keys.groupby(month_keys).groups.items():
+            if since_month is not None and month < since_month:
+                continue
+            part = pa.Table.from_pandas(df.loc[index], schema=table.schema, preserve_index=False)
+            self._atomic_write(f"{month}.arrow", lambda tmp: feather.write_feather(part, tmp, compression=COMPRESSION))
+            partitions[month] = part.num_rows
+
+        # Months that vanished from the resident window are dropped from disk as well
+        live = set(month_keys.dropna().unique())
+        for month in list(partitions):
+            if month not in live:
+                partitions.pop(month)
+                self._remove(f"{month}.arrow")
+
+        self._write_manifest({
+            "source": self.source,
+            "fingerprint": fingerprint,
+            "watermark": None if watermark is None else pd.Timestamp(watermark).isoformat(),
+            "written_at": datetime.now().isoformat(),
+            "meta": meta or {},
+            "partitions": dict(sorted(partitions.items())),
+        })
+
+    # ---- read ----
+    def read(self, columns=None, start=None, end=None):
+        manifest = self.manifest()
+        if not manifest or not manifest.get("partitions"):
+            return None
+
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        months = [
+            m for m in manifest["partitions"]
+            if (start is None or m >= start.strftime("%Y-%m")) and (end is None or m <= end.strftime("%Y-%m"))
+        ]
+        read_columns = None
+        if columns is not None:
+            read_columns = list(dict.fromkeys(list(columns) + [self.date_column]))
+
+        tables = [
+            feather.read_table(os.path.join(self.path, f"{m}.arrow"), columns=read_columns)
+            for m in months
+        ]
+        if not tables:
+            return None
+        df = pa.concat_tables(tables).to_pandas()
+
+        if start is not None:
+            df = df[df[self.date_column] >= start]
+        if end is not None:
+            df = df[df[self.date_column] <= end]
+        if columns is not None:
+            df = df[list(columns)]
+        return df.reset_index(drop=True)
+
+    def watermark(self):
+        manifest = self.manifest()
+        if not manifest or not manifest.get("watermark"):
+            return None
+        return pd.Timestamp(manifest["watermark"])
+
+    def meta(self):
+        manifest = self.manifest()
+        return manifest.get("meta", {}) if manifest else {}
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    # ---- helpers ----
+    def _atomic_write(self, filename, writer):
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        os.close(fd)
+        try:
+            writer(tmp)
+            os.replace(tmp, os.path.join(self.path, filename))
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _remove(self, filename):
+        try:
+            os.remove(os.path.join(self.path, filename))
+        except OSError:
+            pass